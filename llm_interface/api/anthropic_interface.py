@@ -81,7 +81,11 @@ class AnthropicInterface:
             if part_type in ('text', 'input_text'):
                 text_value = part.get('text', '')
                 if text_value:
-                    processed_content.append({"type": "text", "text": text_value})
+                    text_block = {"type": "text", "text": text_value}
+                    # Preserve prompt-caching breakpoints placed by the caller on stable prefixes
+                    if part.get('cache_control'):
+                        text_block["cache_control"] = part['cache_control']
+                    processed_content.append(text_block)
             elif part_type == 'image_base64':
                 base64_data = part.get('data')
                 mime_type = part.get('mime_type', 'image/png')
@@ -238,7 +242,12 @@ class AnthropicInterface:
             
             # Add system prompt if provided
             if system_prompt:
-                api_params['system'] = system_prompt
+                # The system prompt is identical across calls, so mark it as a cacheable prefix
+                api_params['system'] = [{
+                    "type": "text",
+                    "text": system_prompt,
+                    "cache_control": {"type": "ephemeral"}
+                }]
             
             # For reasoning models, set reasoning_effort to medium
             if self.enable_thinking and supports_thinking(self.model_name):
@@ -274,6 +283,14 @@ class AnthropicInterface:
                 'total_tokens': usage.input_tokens + usage.output_tokens
             }
             
+            # Report prompt-cache activity when the API returns it
+            cache_read_tokens = getattr(usage, 'cache_read_input_tokens', None)
+            cache_creation_tokens = getattr(usage, 'cache_creation_input_tokens', None)
+            if cache_read_tokens:
+                token_usage['cache_read_input_tokens'] = cache_read_tokens
+            if cache_creation_tokens:
+                token_usage['cache_creation_input_tokens'] = cache_creation_tokens
+            
             # Add reasoning tokens if available
             if reasoning_text:
                 reasoning_tokens = estimate_tokens(reasoning_text, self.model_name)
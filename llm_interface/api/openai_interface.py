@@ -3,6 +3,7 @@ OpenAI API interface for LLM inference with reasoning support.
 """
 
 import os
+import uuid
 import base64
 from typing import Dict, Any, Optional, List, Union
 from openai import OpenAI
@@ -174,7 +175,6 @@ class OpenAIInterface:
         Returns:
             Dictionary with conversation ID and initial state
         """
-        import uuid
         conversation_id = f"conv_{uuid.uuid4().hex[:8]}"
         conversation_state = {
             'id': conversation_id,
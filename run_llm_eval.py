@@ -10,6 +10,7 @@ import logging
 import glob
 import re
 import shutil
+import sys
 from datetime import datetime
 from typing import List, Dict, Any, Optional, Tuple
 from urllib.parse import urlparse
@@ -27,19 +28,32 @@ from llm_interface.api import OpenAIInterface, AnthropicInterface, GoogleInterfa
 from utils.parsing_utils import parse_actions, KEY_MAPPING
 from utils.gameplay_utils import (
     append_history_entry,
-    extract_scratchpad_text,
+    extract_tagged_blocks,
     save_screenshot,
     save_action_frame,
+    action_frame_path,
     build_frame_reference,
+    frame_reference_base64,
     save_results,
+    open_jsonl_log,
+    append_jsonl_record,
     record_gameplay_step,
     save_prompt,
+    submit_write,
+    flush_pending_writes,
+    BackgroundFrameWriter,
 )
 from utils.llm_interface_utils.rich_logging import print_user_panel, print_assistant_panel
 
 REVERSE_KEY_MAPPING = {value: key for key, value in KEY_MAPPING.items()}
 REVERSE_KEY_MAPPING[None] = "NOOP"
 
+# Display name for every plain and ("HOLD", code) action, so naming a segment is one lookup per action
+ACTION_NAME_TABLE: Dict[Any, str] = {
+    **REVERSE_KEY_MAPPING,
+    **{("HOLD", code): f"HOLD_{name}" for code, name in REVERSE_KEY_MAPPING.items() if code is not None},
+}
+
 # Mapping from key codes to Playwright key names
 KEY_CODE_TO_PLAYWRIGHT_KEY = {
     37: "ArrowLeft",
@@ -58,14 +72,51 @@ KEY_CODE_TO_PLAYWRIGHT_KEY = {
 }
 
 
+AVAILABLE_ACTIONS_LIST = [
+    "UP", "DOWN", "LEFT", "RIGHT", "SPACE",
+    "HOLD_UP", "HOLD_DOWN", "HOLD_LEFT", "HOLD_RIGHT", "HOLD_SPACE",
+    "NOOP", "R", "ENTER",
+]
+AVAILABLE_ACTIONS_BLOCK = "\n\nAvailable actions: " + ", ".join(AVAILABLE_ACTIONS_LIST)
+
+# Placeholders that change every step; prompt text before the first of these is a stable, cacheable prefix
+DYNAMIC_PROMPT_PLACEHOLDERS = ("{SCRATCHPAD}", "{PREVIOUS_ACTIONS_FRAMES}")
+
+
+def _escape_format_braces(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def split_prompt_template(prompt_template: str, static_values: Dict[str, str]) -> Tuple[str, str, str]:
+    """
+    Split the prompt template once per game into (static prefix, dynamic template, output section).
+    Static placeholders are filled in both text parts. The dynamic template is returned as a
+    str.format_map skeleton (literal braces escaped) whose only fields are the dynamic placeholders.
+    """
+    if "**Output:**" in prompt_template:
+        prompt_before_output, prompt_after_split = prompt_template.split("**Output:**", 1)
+        prompt_output_section = "**Output:**" + prompt_after_split
+    else:
+        prompt_before_output = prompt_template
+        prompt_output_section = ""
+
+    positions = [prompt_before_output.find(p) for p in DYNAMIC_PROMPT_PLACEHOLDERS]
+    split_at = min((p for p in positions if p >= 0), default=len(prompt_before_output))
+    static_prefix = prompt_before_output[:split_at]
+    dynamic_template = _escape_format_braces(prompt_before_output[split_at:])
+    for placeholder in DYNAMIC_PROMPT_PLACEHOLDERS:
+        dynamic_template = dynamic_template.replace("{" + placeholder + "}", placeholder)
+    for placeholder, value in static_values.items():
+        static_prefix = static_prefix.replace(placeholder, value)
+        dynamic_template = dynamic_template.replace("{" + placeholder + "}", _escape_format_braces(value))
+    return static_prefix, dynamic_template, prompt_output_section
+
+
 def actions_to_names(actions: List[Optional[int]]) -> str:
     """Convert key codes to human-readable names for logging/prompts."""
     if not actions:
         return "None"
-    names = []
-    for action in actions:
-        names.append(REVERSE_KEY_MAPPING.get(action, str(action)))
-    return ", ".join(names)
+    return ", ".join([ACTION_NAME_TABLE.get(action) or str(action) for action in actions])
 
 
 def format_frame_description(entry: Dict[str, Any]) -> str:
@@ -79,11 +130,11 @@ def format_frame_description(entry: Dict[str, Any]) -> str:
     )
 
 
-def append_frame_visual(sections: List[Dict[str, Any]], label: str, frame_ref: Optional[Dict[str, Optional[str]]]) -> None:
+def append_frame_visual(sections: List[Dict[str, Any]], label: str, frame_ref: Optional[Dict[str, Any]]) -> None:
     """Attach a labeled image payload to the provided message sections."""
     if not frame_ref:
         return
-    base64_data = frame_ref.get("base64")
+    base64_data = frame_reference_base64(frame_ref)
     if not base64_data:
         return
     mime_type = frame_ref.get("mime_type", "image/png")
@@ -112,6 +163,8 @@ def parse_arguments():
     parser.add_argument("--url", type=str, required=True, help="Full game URL")
     parser.add_argument("--max_seconds", type=int, default=120, help="Maximum number of successful API calls")
     parser.add_argument("--headless", action="store_true", help="Run browser in headless mode")
+    parser.add_argument("--capture_all_segments", action="store_true", help="Save a post-action frame after every segment, not only those that can be sent in the next prompt")
+    parser.add_argument("--prompt_frames", type=int, default=2, help="Number of most recent post-action frames from the previous step to include in each prompt")
     return parser.parse_args()
 
 
@@ -121,7 +174,8 @@ def parse_model_string(model_string: str) -> Tuple[str, str]:
         raise ValueError(f"Model string must be in format 'provider:model_name', got: {model_string}")
     parts = model_string.split(":", 1)
     provider = parts[0].strip().lower()
-    model_name = parts[1].strip()
+    # Interned so per-call MODEL_INFO lookups hit the identity fast path
+    model_name = sys.intern(parts[1].strip())
     if not provider or not model_name:
         raise ValueError(f"Both provider and model name must be specified, got: {model_string}")
     return provider, model_name
@@ -255,105 +309,130 @@ def execute_action_playwright(canvas: Locator, action_code: Optional[int]) -> No
         logger.error(f"Error executing action {action_code}: {e}")
 
 
-def execute_hold_actions_playwright(canvas: Locator, key_codes: List[int], duration: float = 0.2) -> None:
-    """Execute multiple HOLD actions simultaneously by sending all keydowns, waiting, then all keyups using Playwright."""
-    if not key_codes:
-        return
-    
+# 20 FPS capture frames only feed the GIF, so they are grabbed as JPEG to cut encode and disk cost
+TEMP_FRAME_EXTENSION = ".jpg"
+TEMP_FRAME_JPEG_QUALITY = 70
+
+# Duration of one action segment; a plan is 5 segments
+SEGMENT_SECONDS = 0.2
+
+# Render frames kept in frame_history; older entries are only archival and are already on disk
+FRAME_HISTORY_MAX_ENTRIES = 100
+
+# Instant keys stay down this long (a few animation frames) so games that poll key state once per frame
+# (p5 keyIsDown / keyIsPressed in draw()) still see the press
+INSTANT_KEY_SECONDS = 0.05
+
+
+def split_segment_keys(segment: List[Any]) -> Tuple[List[str], List[str]]:
+    """Split a plan segment into Playwright key names for its instant presses and its HOLD actions (NOOPs skipped)."""
+    instant_keys, hold_keys = [], []
+    for action in segment:
+        if action is None:
+            continue
+        is_hold = isinstance(action, tuple) and action[0] == "HOLD"
+        key_code = action[1] if is_hold else action
+        key = KEY_CODE_TO_PLAYWRIGHT_KEY.get(key_code)
+        if key is None:
+            logger.warning(f"Unknown key code: {key_code}")
+            continue
+        (hold_keys if is_hold else instant_keys).append(key)
+    return instant_keys, hold_keys
+
+
+def press_keys_playwright(page: Page, keys: List[str]) -> bool:
+    """Send trusted keydowns for the given keys; returns False if the browser rejected them."""
     try:
-        # Focus on the canvas
-        canvas.click()
-        # Get the page from the canvas locator
-        page = canvas.page
-        
-        # Convert key codes to Playwright key names
-        keys = []
-        for key_code in key_codes:
-            if key_code in KEY_CODE_TO_PLAYWRIGHT_KEY:
-                keys.append(KEY_CODE_TO_PLAYWRIGHT_KEY[key_code])
-            else:
-                logger.warning(f"Unknown key code for HOLD: {key_code}")
-        
-        if not keys:
-            return
-        
-        # Send all keydowns simultaneously
         for key in keys:
             page.keyboard.down(key)
-        
-        # Wait for the duration (all keys are held during this time)
-        time.sleep(duration)
-        
-        # Send all keyups simultaneously
-        for key in keys:
-            page.keyboard.up(key)
-            
+        return True
     except Exception as e:
-        logger.error(f"Error executing HOLD actions {key_codes}: {e}")
+        logger.error(f"Error pressing keys {keys}: {e}")
+        return False
 
 
+def release_keys_playwright(page: Page, keys: List[str]) -> None:
+    """Send trusted keyups for the given keys."""
+    for key in keys:
+        try:
+            page.keyboard.up(key)
+        except Exception as e:
+            logger.error(f"Error releasing key {key}: {e}")
 
 
-def get_game_screenshot_playwright(canvas: Locator) -> bytes:
-    """Get PNG bytes of the game canvas using Playwright."""
+def get_game_screenshot_playwright(canvas: Locator, image_type: str = "png", quality: Optional[int] = None) -> bytes:
+    """Get PNG (or JPEG, with quality) bytes of the game canvas using Playwright."""
     try:
-        screenshot_bytes = canvas.screenshot()
+        if image_type == "jpeg":
+            screenshot_bytes = canvas.screenshot(type="jpeg", quality=quality)
+        else:
+            screenshot_bytes = canvas.screenshot()
         return screenshot_bytes
     except Exception as e:
         logger.error(f"Error getting screenshot: {e}")
         return b""
 
 
-def get_score_from_game_state(page: Page) -> Optional[float]:
-    """
-    Extract score directly from the game state using Playwright.
-    Uses the iframe's contentWindow when present; else the window that owns the canvas (document.querySelector('canvas').ownerDocument.defaultView); else window.
-    Tries: getGameState(), gameInstance.gameState, gameState.
-    Returns score as float, or None if not found.
-    """
-    try:
-        score = page.evaluate("""
-            () => {
-                const iframe = document.querySelector('iframe');
-                let gameWin = window;
-                if (iframe && iframe.contentWindow) {
-                    gameWin = iframe.contentWindow;
-                } else {
-                    const canvas = document.querySelector('canvas');
-                    if (canvas && canvas.ownerDocument && canvas.ownerDocument.defaultView) {
-                        gameWin = canvas.ownerDocument.defaultView;
-                    }
-                }
-                if (typeof gameWin.getGameState === 'function') {
-                    const state = gameWin.getGameState();
-                    if (state && typeof state.score !== 'undefined') {
-                        return state.score;
-                    }
-                }
-                if (gameWin.gameInstance && gameWin.gameInstance.gameState) {
-                    const state = gameWin.gameInstance.gameState;
-                    if (typeof state.score !== 'undefined') {
-                        return state.score;
-                    }
-                }
-                if (gameWin.gameState && typeof gameWin.gameState.score !== 'undefined') {
-                    return gameWin.gameState.score;
-                }
-                return null;
+# Shared page-side helpers: resolve the game's window (iframe contentWindow, else the window owning the
+# canvas, else window) and read score / end state from getGameState(), gameInstance.gameState or gameState.
+_GAME_STATE_JS_PRELUDE = """
+    const iframe = document.querySelector('iframe');
+    let gameWin = window;
+    if (iframe && iframe.contentWindow) {
+        gameWin = iframe.contentWindow;
+    } else {
+        const canvas = document.querySelector('canvas');
+        if (canvas && canvas.ownerDocument && canvas.ownerDocument.defaultView) {
+            gameWin = canvas.ownerDocument.defaultView;
+        }
+    }
+    const isEndPhase = (gamePhase) => gamePhase === 'GAME_OVER' || gamePhase === 'GAME_OVER_LOSE' ||
+        gamePhase === 'GAME_OVER_WIN' || gamePhase === 'ENDED';
+    const readScore = () => {
+        if (typeof gameWin.getGameState === 'function') {
+            const state = gameWin.getGameState();
+            if (state && typeof state.score !== 'undefined') {
+                return state.score;
             }
-        """)
-        
-        if score is not None:
-            try:
-                return float(score)
-            except (ValueError, TypeError):
-                logger.debug(f"Score value is not numeric: {score}")
-                return None
-        
+        }
+        if (gameWin.gameInstance && gameWin.gameInstance.gameState) {
+            const state = gameWin.gameInstance.gameState;
+            if (typeof state.score !== 'undefined') {
+                return state.score;
+            }
+        }
+        if (gameWin.gameState && typeof gameWin.gameState.score !== 'undefined') {
+            return gameWin.gameState.score;
+        }
+        return null;
+    };
+    const readEnded = () => {
+        if (gameWin.game && typeof gameWin.game.ended !== 'undefined') {
+            if (gameWin.game.ended === true) return true;
+        }
+        if (typeof gameWin.getGameState === 'function') {
+            const state = gameWin.getGameState();
+            if (state && state.gamePhase && isEndPhase(state.gamePhase)) {
+                return true;
+            }
+        }
+        if (gameWin.gameInstance && gameWin.gameInstance.gameState) {
+            if (isEndPhase(gameWin.gameInstance.gameState.gamePhase)) {
+                return true;
+            }
+        }
+        return false;
+    };
+"""
+
+
+def _coerce_score(score: Any) -> Optional[float]:
+    if score is None:
         return None
-        
-    except Exception as e:
-        logger.debug(f"Error reading score from game state: {e}")
+    try:
+        return float(score)
+    except (ValueError, TypeError):
+        logger.debug(f"Score value is not numeric: {score}")
         return None
 
 
@@ -363,41 +442,7 @@ def check_game_ended(page: Page) -> bool:
     Tries: game.ended, getGameState().gamePhase, gameInstance.gameState.gamePhase.
     """
     try:
-        ended = page.evaluate("""
-            () => {
-                const iframe = document.querySelector('iframe');
-                let gameWin = window;
-                if (iframe && iframe.contentWindow) {
-                    gameWin = iframe.contentWindow;
-                } else {
-                    const canvas = document.querySelector('canvas');
-                    if (canvas && canvas.ownerDocument && canvas.ownerDocument.defaultView) {
-                        gameWin = canvas.ownerDocument.defaultView;
-                    }
-                }
-                if (gameWin.game && typeof gameWin.game.ended !== 'undefined') {
-                    if (gameWin.game.ended === true) return true;
-                }
-                if (typeof gameWin.getGameState === 'function') {
-                    const state = gameWin.getGameState();
-                    if (state && state.gamePhase) {
-                        const gamePhase = state.gamePhase;
-                        if (gamePhase === 'GAME_OVER' || gamePhase === 'GAME_OVER_LOSE' ||
-                            gamePhase === 'GAME_OVER_WIN' || gamePhase === 'ENDED') {
-                            return true;
-                        }
-                    }
-                }
-                if (gameWin.gameInstance && gameWin.gameInstance.gameState) {
-                    const gamePhase = gameWin.gameInstance.gameState.gamePhase;
-                    if (gamePhase === 'GAME_OVER' || gamePhase === 'GAME_OVER_LOSE' ||
-                        gamePhase === 'GAME_OVER_WIN' || gamePhase === 'ENDED') {
-                        return true;
-                    }
-                }
-                return false;
-            }
-        """)
+        ended = page.evaluate("() => {" + _GAME_STATE_JS_PRELUDE + "return readEnded(); }")
         result = bool(ended)
         if result:
             logger.info("Game end detected via window.game.ended or gamePhase")
@@ -407,6 +452,24 @@ def check_game_ended(page: Page) -> bool:
         return False
 
 
+def read_game_status(page: Page) -> Tuple[bool, Optional[float]]:
+    """
+    Return (ended, score) from the game state using a single evaluate round-trip instead of one per check.
+    Score tries getGameState(), gameInstance.gameState, gameState and is None if missing or not numeric.
+    """
+    try:
+        status = page.evaluate(
+            "() => {" + _GAME_STATE_JS_PRELUDE + "return {ended: readEnded(), score: readScore()}; }"
+        )
+    except Exception as e:
+        logger.warning(f"Error reading game status: {e}")
+        return False, None
+    ended = bool(status.get("ended"))
+    if ended:
+        logger.info("Game end detected via window.game.ended or gamePhase")
+    return ended, _coerce_score(status.get("score"))
+
+
 def restart_game(canvas: Locator, page: Page) -> None:
     """
     Restart the game by pressing 'R' key (restart) followed by Enter key (start).
@@ -508,7 +571,7 @@ def create_gameplay_gif(screenshot_dir: str, output_path: Optional[str] = None,
     """
     try:
         # Find all frame screenshots (sorted by filename)
-        pattern = os.path.join(screenshot_dir, "frame_*.png")
+        pattern = os.path.join(screenshot_dir, f"frame_*{TEMP_FRAME_EXTENSION}")
         image_files = sorted(glob.glob(pattern))
         
         if not image_files:
@@ -517,20 +580,22 @@ def create_gameplay_gif(screenshot_dir: str, output_path: Optional[str] = None,
         
         logger.info(f"Found {len(image_files)} screenshots, creating GIF...")
         
-        # Load images
-        images = []
-        for img_path in image_files:
-            try:
-                img = Image.open(img_path)
-                # Convert to RGB if necessary (GIFs don't support RGBA)
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                images.append(img)
-            except Exception as e:
-                logger.warning(f"Failed to load image {img_path}: {e}")
-                continue
+        # Decode frames one at a time while the GIF encoder consumes them, rather than holding
+        # every decoded RGB frame (and its open file handle) in a list first
+        def iter_frames():
+            for img_path in image_files:
+                try:
+                    with Image.open(img_path) as img:
+                        # Convert to RGB (GIFs don't support RGBA); convert() also detaches from the file
+                        frame = img.convert('RGB')
+                except Exception as e:
+                    logger.warning(f"Failed to load image {img_path}: {e}")
+                    continue
+                yield frame
         
-        if not images:
+        frames = iter_frames()
+        first_frame = next(frames, None)
+        if first_frame is None:
             logger.error("No valid images loaded for GIF creation")
             return None
         
@@ -542,10 +607,10 @@ def create_gameplay_gif(screenshot_dir: str, output_path: Optional[str] = None,
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
         # Create GIF
-        images[0].save(
+        first_frame.save(
             output_path,
             save_all=True,
-            append_images=images[1:],
+            append_images=frames,
             duration=duration,
             loop=0  # Loop forever
         )
@@ -576,14 +641,18 @@ def run_one_game(
     last_executed_actions: List[Optional[int]] = []
     last_render_frames: List[Dict[str, Any]] = []
     
-    last_screenshot_time = None
+    # 20 FPS capture is paced on time.perf_counter() deadlines so sleep overshoot does not accumulate
+    next_screenshot_time = None
     screenshot_interval = 1.0 / 20.0
     
     interface = get_interface(model_provider, model_name)
     
-    content_history: List[Dict[str, Any]] = []
     full_content_history: List[Dict[str, Any]] = []
     gameplay_log: List[Dict[str, Any]] = []
+    gameplay_log_stream = None
+    content_history_stream = None
+    
+    frame_writer: Optional[BackgroundFrameWriter] = None
     
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=args.headless)
@@ -604,6 +673,10 @@ def run_one_game(
             os.makedirs(gameplay_dir, exist_ok=True)
             temp_screenshot_dir = os.path.join(results_dir, "temp_screenshots")
             os.makedirs(temp_screenshot_dir, exist_ok=True)
+            frame_writer = BackgroundFrameWriter()
+            # Steps and turns are appended as they happen so a crashed run still leaves readable logs
+            gameplay_log_stream = open_jsonl_log(os.path.join(results_dir, "gameplay_log.jsonl"))
+            content_history_stream = open_jsonl_log(os.path.join(results_dir, "content_history.jsonl"))
             
             # Find canvas
             canvas = find_canvas(page)
@@ -622,26 +695,31 @@ def run_one_game(
             time.sleep(0.05)
             
             # Initialize screenshot capture timing
-            last_screenshot_time = time.time()
+            next_screenshot_time = time.perf_counter()
             logger.info(f"Will capture screenshots at 20 FPS. Temp dir: {temp_screenshot_dir}")
             
             # Helper function to capture screenshot if enough time has passed
             def capture_screenshot_if_needed():
-                """Capture a screenshot to temp folder if enough time has passed (20 FPS)."""
-                nonlocal last_screenshot_time, temp_frame_index
-                current_time = time.time()
-                if last_screenshot_time is None or (current_time - last_screenshot_time) >= screenshot_interval:
+                """Capture a screenshot to temp folder if enough time has passed (20 FPS); disk writes happen on frame_writer."""
+                nonlocal next_screenshot_time, temp_frame_index
+                current_time = time.perf_counter()
+                if next_screenshot_time is None or current_time >= next_screenshot_time:
+                    # Advance on the fixed 20 FPS grid (even if this capture fails, so callers never spin);
+                    # after a long gap such as the LLM call, restart the grid from now
+                    next_screenshot_time = (next_screenshot_time or current_time) + screenshot_interval
+                    if next_screenshot_time <= current_time:
+                        next_screenshot_time = current_time + screenshot_interval
                     try:
-                        screenshot_bytes = get_game_screenshot_playwright(canvas)
-                        if screenshot_bytes and len(screenshot_bytes) > 0:
-                            frame_filename = f"frame_{temp_frame_index:06d}.png"
-                            frame_path = os.path.join(temp_screenshot_dir, frame_filename)
-                            with open(frame_path, 'wb') as f:
-                                f.write(screenshot_bytes)
-                            temp_frame_index += 1
-                            if temp_frame_index % 100 == 0:
-                                logger.info(f"Captured {temp_frame_index} screenshots so far")
-                            last_screenshot_time = current_time
+                        screenshot_bytes = get_game_screenshot_playwright(
+                            canvas, image_type="jpeg", quality=TEMP_FRAME_JPEG_QUALITY
+                        )
+                        if not screenshot_bytes:
+                            return
+                        frame_filename = f"frame_{temp_frame_index:06d}{TEMP_FRAME_EXTENSION}"
+                        frame_writer.write(os.path.join(temp_screenshot_dir, frame_filename), screenshot_bytes)
+                        temp_frame_index += 1
+                        if temp_frame_index % 100 == 0:
+                            logger.info(f"Captured {temp_frame_index} screenshots so far")
                     except Exception as e:
                         logger.debug(f"Screenshot capture error (non-critical): {e}")
             
@@ -687,6 +765,23 @@ def run_one_game(
                 game_controls_text += "\n\nAdditional Controls:\n" + "\n".join(additional_controls)
                 logger.info(f"Added additional controls: {additional_controls}")
             
+            # Static prompt content is built once; it leads every message so provider prefix caching can hit
+            game_description_block = f"\n\nGame Description:\n{game_description}" if game_description else ""
+            game_control_block = f"\n\nGame Controls:\n{game_controls_text}" if game_controls_text else ""
+            static_prefix_text, dynamic_prompt_template, prompt_output_section = split_prompt_template(
+                prompt_template,
+                {
+                    "{GAME_DESCRIPTION}": game_description_block,
+                    "{GAME_CONTROL}": game_control_block,
+                    "{AVAILABLE_ACTIONS}": AVAILABLE_ACTIONS_BLOCK,
+                },
+            )
+            static_prefix_section = {
+                "type": "text",
+                "text": static_prefix_text,
+                "cache_control": {"type": "ephemeral"},
+            }
+            
             total_actions_count = 0
             successful_api_calls = 0
             episode_count = 1
@@ -718,24 +813,19 @@ def run_one_game(
                     screenshot_frame = build_frame_reference(screenshot_path, screenshot_bytes)
                 log_screenshot = os.path.relpath(screenshot_path, results_dir) if screenshot_path else ""
                 
-                # Check if game has ended before pausing
-                game_ended_before_pause = check_game_ended(page)
+                # Check if game has ended and read the score before pausing (one round-trip)
+                game_ended_before_pause, current_score = read_game_status(page)
                 if game_ended_before_pause:
                     logger.info("Game has ended (detected before pause), will restart after LLM response")
+                if current_score is not None:
+                    logger.info(f"Score read from game state: {current_score}")
                 
                 # Pause the game before querying LLM (Esc toggles pause)
                 logger.info("Pausing game before LLM query (Esc)...")
                 execute_action_playwright(canvas, 27)  # Press ESC to pause
                 time.sleep(0.1)  # Wait for pause to take effect
                 
-                # Read score from game state
-                current_score = get_score_from_game_state(page)
-                if current_score is not None:
-                    logger.info(f"Score read from game state: {current_score}")
-                
-                # Prepare message content by filling the prompt template
-                game_description_block = f"\n\nGame Description:\n{game_description}" if game_description else ""
-                game_control_block = f"\n\nGame Controls:\n{game_controls_text}" if game_controls_text else ""
+                # Fill the per-step placeholders; static content was resolved before the loop
                 scratchpad_block = (
                     f"\n\n<scratchpad>\n{current_scratchpad_text}\n</scratchpad>" if current_scratchpad_text else ""
                 )
@@ -743,55 +833,39 @@ def run_one_game(
                 if last_executed_actions:
                     action_names = actions_to_names(last_executed_actions)
                     previous_actions_block = f"\n\nPrevious actions applied: {action_names}"
-                available_actions_list = [
-                    "UP", "DOWN", "LEFT", "RIGHT", "SPACE",
-                    "HOLD_UP", "HOLD_DOWN", "HOLD_LEFT", "HOLD_RIGHT", "HOLD_SPACE",
-                    "NOOP", "R", "ENTER",
-                ]
-                available_actions_block = "\n\nAvailable actions: " + ", ".join(available_actions_list)
-
-                # Split prompt: context (with placeholders) before frames, output instructions after frames
-                if "**Output:**" in prompt_template:
-                    prompt_before_output, prompt_after_split = prompt_template.split("**Output:**", 1)
-                    prompt_output_section = "**Output:**" + prompt_after_split
-                else:
-                    prompt_before_output = prompt_template
-                    prompt_output_section = ""
-
-                text_before_frames = (
-                    prompt_before_output.replace("{GAME_DESCRIPTION}", game_description_block)
-                    .replace("{GAME_CONTROL}", game_control_block)
-                    .replace("{SCRATCHPAD}", scratchpad_block)
-                    .replace("{PREVIOUS_ACTIONS_FRAMES}", previous_actions_block)
-                    .replace("{AVAILABLE_ACTIONS}", available_actions_block)
-                )
+                dynamic_text = dynamic_prompt_template.format_map({
+                    "SCRATCHPAD": scratchpad_block,
+                    "PREVIOUS_ACTIONS_FRAMES": previous_actions_block,
+                })
 
-                visual_sections: List[Dict[str, Any]] = []
-                if last_render_frames:
-                    for frame_entry in last_render_frames:
-                        label = format_frame_description(frame_entry)
-                        append_frame_visual(visual_sections, label, frame_entry["frame"])
+                # Order: static prefix (cached) → dynamic context → frames → output instructions.
+                # Frames are appended straight into the message; append_frame_visual skips any that fail to encode.
+                current_content: List[Dict[str, Any]] = [static_prefix_section]
+                if dynamic_text.strip():
+                    current_content.append({"type": "text", "text": dynamic_text})
+                for frame_entry in last_render_frames:
+                    append_frame_visual(current_content, format_frame_description(frame_entry), frame_entry["frame"])
                 if screenshot_frame:
                     append_frame_visual(
-                        visual_sections,
+                        current_content,
                         "Current observed state before executing the next sequence of actions.",
                         screenshot_frame
                     )
-
-                # Order: context text → frames → output instructions
-                current_content = [{"type": "text", "text": text_before_frames}] + visual_sections
                 if prompt_output_section:
                     current_content.append({"type": "text", "text": prompt_output_section})
                 
                 # Save the full prompt before sending to model
-                save_prompt(results_dir, step_count, episode_count, current_content)
+                submit_write(save_prompt, results_dir, step_count, episode_count, current_content)
                 
                 print_user_panel(current_content)
                 user_entry = {"role": "user", "content": current_content}
-                append_history_entry(user_entry, content_history, full_content_history)
+                append_history_entry(user_entry, full_content_history)
+                if content_history_stream is not None:
+                    append_jsonl_record(content_history_stream, user_entry)
                 
                 logger.info("Requesting LLM response...")
-                # Only send the current message, not the full history (to prevent token growth)
+                # Only send the current message; memory is carried by the scratchpad and the
+                # byte-identical static prefix stays cacheable by the provider across steps
                 response = interface.generate(messages=[user_entry])
                 successful_api_calls += 1
                 
@@ -861,14 +935,12 @@ def run_one_game(
                     "role": "assistant",
                     "content": response['output']
                 }
-                append_history_entry(assistant_entry, content_history, full_content_history)
-                
-                # Clear content_history after each step to prevent token accumulation
-                # (We keep full_content_history for archival purposes)
-                content_history.clear()
+                append_history_entry(assistant_entry, full_content_history)
+                if content_history_stream is not None:
+                    append_jsonl_record(content_history_stream, assistant_entry)
                 
                 # Extract scratchpad from response
-                scratchpad_text = extract_scratchpad_text(assistant_output_text)
+                scratchpad_text = extract_tagged_blocks(assistant_output_text).get("scratchpad")
                 if scratchpad_text:
                     current_scratchpad_text = scratchpad_text
                     logger.info(f"Extracted scratchpad: {scratchpad_text[:100]}...")
@@ -879,75 +951,74 @@ def run_one_game(
                 
                 action_snapshots: List[Dict[str, Any]] = []
                 executed_actions: List[Optional[int]] = []
+                step_frames: List[Dict[str, Any]] = []
 
                 # Resume the game before executing actions
                 logger.info("Resuming game to execute actions...")
                 execute_action_playwright(canvas, 27)  # Press ESC to resume
                 time.sleep(0.2)  # Wait for resume to take effect
 
-                # Execute actions - parse_actions returns 5 segments, process each segment
-                # Each segment represents a 0.2 second time window
+                # Execute actions - parse_actions returns 5 segments, each a 0.2 second time window.
+                # Keys go down at the segment start as trusted input; instant keys are released after
+                # INSTANT_KEY_SECONDS and HOLD keys at the segment end, with 20 FPS capture in between.
+                if successful_api_calls < args.max_seconds:
+                    try:
+                        canvas.click()  # Focus the canvas so the keypresses reach the game
+                    except Exception as e:
+                        logger.error(f"Error focusing canvas: {e}")
+                plan_start = time.perf_counter()
                 for segment_idx, segment in enumerate(actions):
                     if successful_api_calls >= args.max_seconds:
                         break
                     
-                    # Process all actions in this segment
-                    # Instant actions are applied once, HOLD actions are held for the segment duration
-                    hold_actions = []
-                    instant_actions = []
-                    
-                    for action in segment:
-                        if isinstance(action, tuple) and action[0] == "HOLD":
-                            # HOLD action - will be held for the segment duration
-                            hold_actions.append(action[1])
-                        elif action is not None:
-                            # Instant action
-                            instant_actions.append(action)
-                    
-                    # Execute instant actions first (each gets a quick press)
-                    for action_code in instant_actions:
-                        execute_action_playwright(canvas, action_code)
-                        executed_actions.append(action_code)
-                        total_actions_count += 1
-
-                    # Execute all HOLD actions simultaneously (all keydowns, wait, all keyups)
-                    if hold_actions:
-                        execute_hold_actions_playwright(canvas, hold_actions, duration=0.2)
-                        for key_code in hold_actions:
-                            executed_actions.append(("HOLD", key_code))
-                            total_actions_count += 1
-                    
-                    # If no actions in this segment, it's a NOOP - just wait
-                    if not instant_actions and not hold_actions:
-                        time.sleep(0.2)
+                    instant_keys, hold_keys = split_segment_keys(segment)
+                    if press_keys_playwright(page, instant_keys + hold_keys):
+                        for action in segment:
+                            # HOLD actions are the shared immutable tuples from KEY_MAPPING, so they are recorded as-is
+                            if action is not None:
+                                executed_actions.append(action)
+                                total_actions_count += 1
                     
-                    # Capture screenshot during action execution (20 FPS)
-                    capture_screenshot_if_needed()
+                    # Wait for the segment to elapse, capturing screenshots during action execution (20 FPS)
+                    segment_end = plan_start + (segment_idx + 1) * SEGMENT_SECONDS
+                    instant_release = min(segment_end, time.perf_counter() + INSTANT_KEY_SECONDS)
+                    while time.perf_counter() < segment_end:
+                        if instant_keys and time.perf_counter() >= instant_release:
+                            release_keys_playwright(page, instant_keys)
+                            instant_keys = []
+                        capture_screenshot_if_needed()
+                        wake_at = min(segment_end, next_screenshot_time or segment_end)
+                        if instant_keys:
+                            wake_at = min(wake_at, instant_release)
+                        time.sleep(max(0.0, wake_at - time.perf_counter()))
+                    release_keys_playwright(page, instant_keys + hold_keys)
 
-                    # Capture screenshot after segment
-                    post_action_bytes = get_game_screenshot_playwright(canvas)
+                    # Capture screenshot after segment, only for segments whose frame can reach the next prompt
+                    # (the 20 FPS capture already archives the rest)
+                    post_action_bytes = b""
+                    if args.capture_all_segments or segment_idx >= len(actions) - args.prompt_frames:
+                        post_action_bytes = get_game_screenshot_playwright(canvas)
                     action_shot_path = ""
                     frame_entry = None
                     if post_action_bytes:
-                        action_shot_path = save_action_frame(gameplay_dir, frame_index, post_action_bytes)
+                        action_shot_path = action_frame_path(gameplay_dir, frame_index)
+                        submit_write(save_action_frame, gameplay_dir, frame_index, post_action_bytes)
                         frame_index += 1
-                        frame_entry = build_frame_reference(action_shot_path, post_action_bytes)
+                        # Encoded lazily: only frames that end up in a prompt pay for resize + base64
+                        frame_entry = build_frame_reference(action_shot_path, post_action_bytes, defer_encoding=True)
                     if frame_entry:
                         # Create action name string for this segment and append to frame history
-                        action_names = []
-                        for action in segment:
-                            if isinstance(action, tuple) and action[0] == "HOLD":
-                                action_names.append(f"HOLD_{REVERSE_KEY_MAPPING.get(action[1], str(action[1]))}")
-                            elif action is not None:
-                                action_names.append(REVERSE_KEY_MAPPING.get(action, str(action)))
+                        action_names = [ACTION_NAME_TABLE.get(action) or str(action) for action in segment if action is not None]
                         action_name_str = ", ".join(action_names) if action_names else "NOOP"
-                        frame_history.append({
+                        frame_record = {
                             "frame": frame_entry,
                             "episode": episode_count,
                             "step": step_count,
                             "action_index": segment_idx,
                             "action_name": action_name_str,
-                        })
+                        }
+                        frame_history.append(frame_record)
+                        step_frames.append(frame_record)
                     action_snapshots.append({
                         "index": segment_idx,
                         "actions": segment,
@@ -956,12 +1027,16 @@ def run_one_game(
             
             
                 last_executed_actions = executed_actions.copy()
-                # Store render frames from this step (frames added to frame_history during action execution)
-                last_render_frames = []
-                for frame_entry in frame_history:
-                    if (frame_entry.get("step") == step_count and
-                        frame_entry.get("episode") == episode_count):
-                        last_render_frames.append(frame_entry)
+                # Store render frames from this step (collected during action execution)
+                last_render_frames = step_frames
+                if len(frame_history) > FRAME_HISTORY_MAX_ENTRIES:
+                    del frame_history[:-FRAME_HISTORY_MAX_ENTRIES]
+                # Only the most recent frames are sent; older ones add visual tokens with little signal
+                keep_from = max(0, len(last_render_frames) - max(0, args.prompt_frames))
+                for frame_entry in last_render_frames[:keep_from]:
+                    # Never encoded, so drop the raw capture instead of holding it in frame_history
+                    frame_entry["frame"]["image_bytes"] = None
+                last_render_frames = last_render_frames[keep_from:]
 
                 log_entry = {
                     "episode": episode_count,
@@ -984,7 +1059,10 @@ def run_one_game(
                     }
                 }
                 gameplay_log.append(log_entry)
-                record_gameplay_step(
+                if gameplay_log_stream is not None:
+                    append_jsonl_record(gameplay_log_stream, log_entry)
+                submit_write(
+                    record_gameplay_step,
                     gameplay_dir=gameplay_dir,
                     episode=episode_count,
                     step=step_count,
@@ -995,16 +1073,7 @@ def run_one_game(
                     score=current_score,
                     model_name=model_name,
                     game_name=game_name,
-                    token_usage={
-                        "input_tokens": input_tokens,
-                        "output_tokens": output_tokens,
-                        "total_tokens": total_tokens,
-                        "reasoning_tokens": reasoning_tokens if reasoning_tokens > 0 else None,
-                        "cumulative_input_tokens": cumulative_input_tokens,
-                        "cumulative_output_tokens": cumulative_output_tokens,
-                        "cumulative_total_tokens": cumulative_total_tokens,
-                        "cumulative_reasoning_tokens": cumulative_reasoning_tokens if cumulative_reasoning_tokens > 0 else None
-                    }
+                    token_usage=log_entry["token_usage"]
                 )
                 
                 step_count += 1
@@ -1014,12 +1083,25 @@ def run_one_game(
         except Exception as e:
             logger.error(f"Unexpected error: {e}")
         finally:
-            save_results(results_dir, full_content_history, gameplay_log)
+            for log_stream in (gameplay_log_stream, content_history_stream):
+                if log_stream is not None:
+                    log_stream.close()
+            save_results(
+                results_dir,
+                full_content_history,
+                gameplay_log,
+                content_history_jsonl=content_history_stream.name if content_history_stream is not None else None,
+            )
+            
+            # Let queued frame and step writes land before the GIF is assembled
+            if frame_writer is not None:
+                frame_writer.close()
+            flush_pending_writes()
             
             # Create GIF from temp screenshots folder
             logger.info(f"Creating GIF from {temp_frame_index} screenshots at 20 FPS...")
             if os.path.exists(temp_screenshot_dir):
-                screenshot_files = glob.glob(os.path.join(temp_screenshot_dir, "frame_*.png"))
+                screenshot_files = glob.glob(os.path.join(temp_screenshot_dir, f"frame_*{TEMP_FRAME_EXTENSION}"))
                 logger.info(f"Found {len(screenshot_files)} screenshots in temp folder")
                 
                 if screenshot_files:
@@ -1,8 +1,10 @@
 import time
 import logging
+import weakref
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import StaleElementReferenceException
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +25,111 @@ KEY_CODE_TO_KEY_NAME = {
     89: 'y', 90: 'z',
 }
 
+# Keyboard dispatcher installed into the page once; execute_action then only ships its arguments
+_KEY_DISPATCHER_JS = """
+var CODE_MAP = {37: 'ArrowLeft', 38: 'ArrowUp', 39: 'ArrowRight', 40: 'ArrowDown',
+                32: 'Space', 13: 'Enter', 27: 'Escape'};
+
+var fire = function(canvas, type, keyCode, key) {
+    canvas.dispatchEvent(new KeyboardEvent(type, {
+        keyCode: keyCode,
+        which: keyCode,
+        key: key,
+        code: CODE_MAP[keyCode] || key,
+        bubbles: true,
+        cancelable: true
+    }));
+};
+
+window.__keyDown = function(canvas, keyCode, key) {
+    fire(canvas, 'keydown', keyCode, key);
+    // Dispatch keypress event (for printable characters)
+    if (keyCode >= 32 && keyCode !== 127) {
+        fire(canvas, 'keypress', keyCode, key);
+    }
+};
+
+window.__keyUp = function(canvas, keyCode, key) {
+    fire(canvas, 'keyup', keyCode, key);
+};
+
+window.__dispatchKey = function(canvas, keyCode, key) {
+    window.__keyDown(canvas, keyCode, key);
+    window.__keyUp(canvas, keyCode, key);
+};
+"""
+
+# Calls one dispatcher entry point; returns false when the page was (re)loaded since it was installed
+_CALL_KEY_DISPATCHER_JS = """
+var entryPoint = window[arguments[0]];
+if (typeof entryPoint !== 'function') return false;
+entryPoint(arguments[1], arguments[2], arguments[3]);
+return true;
+"""
+
+
+# Canvas handles and focus state per driver, so actions skip the element lookup and refocus click;
+# weakly keyed on the driver itself, so entries vanish with it and a new driver never inherits them
+_canvas_cache = weakref.WeakKeyDictionary()
+_canvas_focused = weakref.WeakSet()
+
+
+def get_canvas(driver):
+    """Return the cached game canvas element for a driver, looking it up on first use."""
+    canvas = _canvas_cache.get(driver)
+    if canvas is None:
+        canvas = driver.find_element(By.ID, "defaultCanvas0")
+        _canvas_cache[driver] = canvas
+    return canvas
+
+
+def invalidate_canvas(driver):
+    """Forget the cached canvas and focus state after the page was reloaded or reset."""
+    _canvas_cache.pop(driver, None)
+    _canvas_focused.discard(driver)
+
+
+def focus_canvas(driver, canvas):
+    """Click the canvas to give it keyboard focus, unless it already has it."""
+    if driver in _canvas_focused:
+        return
+    canvas.click()
+    time.sleep(0.05)  # Small delay to ensure focus
+    _canvas_focused.add(driver)
+
+
+def install_key_dispatcher(driver):
+    """Install the window.__dispatchKey / __keyDown / __keyUp keyboard dispatchers into the current page."""
+    driver.execute_script(_KEY_DISPATCHER_JS)
+
+
+def _dispatch_key(driver, canvas, entry_point, action_code):
+    """Invoke an installed dispatcher entry point for a key code, installing it first if needed."""
+    key_name = KEY_CODE_TO_KEY_NAME.get(action_code)
+    if key_name is None:
+        logger.warning(f"Unknown key code: {action_code}")
+        return
+    if not driver.execute_script(_CALL_KEY_DISPATCHER_JS, entry_point, canvas, action_code, key_name):
+        install_key_dispatcher(driver)
+        driver.execute_script(_CALL_KEY_DISPATCHER_JS, entry_point, canvas, action_code, key_name)
+
+
+def dispatch_keydown(driver, canvas, action_code):
+    """Dispatch a single keydown (and keypress for printable keys) to the canvas."""
+    try:
+        _dispatch_key(driver, canvas, "__keyDown", action_code)
+    except Exception as e:
+        logger.error(f"Error dispatching keydown {action_code}: {e}")
+
+
+def dispatch_keyup(driver, canvas, action_code):
+    """Dispatch a single keyup to the canvas."""
+    try:
+        _dispatch_key(driver, canvas, "__keyUp", action_code)
+    except Exception as e:
+        logger.error(f"Error dispatching keyup {action_code}: {e}")
+
+
 def execute_action(driver, action_code):
     """Execute a single action in the game by sending actual keypresses to the canvas."""
     if action_code is None:
@@ -30,75 +137,18 @@ def execute_action(driver, action_code):
         return
     
     try:
-        # Find the canvas element
-        canvas = driver.find_element(By.ID, "defaultCanvas0")
-        
-        # Focus on the canvas to ensure keypresses are received
-        canvas.click()
-        time.sleep(0.05)  # Small delay to ensure focus
-        
-        # Get the key name to send
-        if action_code in KEY_CODE_TO_KEY_NAME:
-            key_name = KEY_CODE_TO_KEY_NAME[action_code]
-            
-            # Send keypress using JavaScript to dispatch keyboard events
-            # This is more reliable for canvas elements than Selenium's ActionChains
-            # Escape the key name for JavaScript string
-            key_name_escaped = key_name.replace("'", "\\'").replace("\\", "\\\\")
-            
-            driver.execute_script(f"""
-                var canvas = arguments[0];
-                var keyCode = {action_code};
-                var key = '{key_name_escaped}';
-                
-                // Create and dispatch keydown event
-                var keydownEvent = new KeyboardEvent('keydown', {{
-                    keyCode: keyCode,
-                    which: keyCode,
-                    key: key,
-                    code: keyCode === 37 ? 'ArrowLeft' : 
-                          keyCode === 38 ? 'ArrowUp' : 
-                          keyCode === 39 ? 'ArrowRight' : 
-                          keyCode === 40 ? 'ArrowDown' : 
-                          keyCode === 32 ? 'Space' : 
-                          keyCode === 13 ? 'Enter' : 
-                          keyCode === 27 ? 'Escape' : key,
-                    bubbles: true,
-                    cancelable: true
-                }});
-                canvas.dispatchEvent(keydownEvent);
-                
-                // Create and dispatch keypress event (for printable characters)
-                if (keyCode >= 32 && keyCode !== 127) {{
-                    var keypressEvent = new KeyboardEvent('keypress', {{
-                        keyCode: keyCode,
-                        which: keyCode,
-                        key: key,
-                        bubbles: true,
-                        cancelable: true
-                    }});
-                    canvas.dispatchEvent(keypressEvent);
-                }}
-                
-                // Create and dispatch keyup event
-                var keyupEvent = new KeyboardEvent('keyup', {{
-                    keyCode: keyCode,
-                    which: keyCode,
-                    key: key,
-                    code: keyCode === 37 ? 'ArrowLeft' : 
-                          keyCode === 38 ? 'ArrowUp' : 
-                          keyCode === 39 ? 'ArrowRight' : 
-                          keyCode === 40 ? 'ArrowDown' : 
-                          keyCode === 32 ? 'Space' : 
-                          keyCode === 13 ? 'Enter' : 
-                          keyCode === 27 ? 'Escape' : key,
-                    bubbles: true,
-                    cancelable: true
-                }});
-                canvas.dispatchEvent(keyupEvent);
-            """, canvas)
-        else:
-            logger.warning(f"Unknown key code: {action_code}")
+        # Send keypress using JavaScript to dispatch keyboard events
+        # This is more reliable for canvas elements than Selenium's ActionChains
+        try:
+            canvas = get_canvas(driver)
+            focus_canvas(driver, canvas)
+            _dispatch_key(driver, canvas, "__dispatchKey", action_code)
+        except StaleElementReferenceException:
+            # The page re-created the canvas; look it up and refocus once
+            invalidate_canvas(driver)
+            canvas = get_canvas(driver)
+            focus_canvas(driver, canvas)
+            _dispatch_key(driver, canvas, "__dispatchKey", action_code)
             
     except Exception as e:
         logger.error(f"Error executing action {action_code}: {e}")
@@ -141,16 +191,23 @@ def execute_action_segment(driver, action_segment, duration=0.2):
     
     # Apply continuous actions for the duration, or wait if no continuous actions
     if continuous_actions:
-        # For continuous actions, we'll call game.step() multiple times during the duration
-        # Using a small interval (0.05s) to simulate continuous holding
-        segment_start = time.time()
-        interval = 0.05  # Call every 50ms
-        while time.time() - segment_start < duration:
+        # A real hold: one keydown per key, wait out the segment, then one keyup per key
+        segment_start = time.perf_counter()
+        try:
+            canvas = get_canvas(driver)
+        except Exception as e:
+            logger.error(f"Error finding canvas for held actions {continuous_actions}: {e}")
+            time.sleep(duration)
+            return
+        try:
             for action_code in continuous_actions:
-                execute_action(driver, action_code)
-            remaining_time = duration - (time.time() - segment_start)
+                dispatch_keydown(driver, canvas, action_code)
+            remaining_time = duration - (time.perf_counter() - segment_start)
             if remaining_time > 0:
-                time.sleep(min(interval, remaining_time))
+                time.sleep(remaining_time)
+        finally:
+            for action_code in continuous_actions:
+                dispatch_keyup(driver, canvas, action_code)
     else:
         # No continuous actions - just wait for the duration
         # (instant actions were already applied at the start, or it's a NOOP)
@@ -159,8 +216,11 @@ def execute_action_segment(driver, action_segment, duration=0.2):
 def get_game_screenshot(driver) -> bytes:
     """Get PNG bytes of the game canvas."""
     try:
-        canvas = driver.find_element(By.ID, "defaultCanvas0")
-        return canvas.screenshot_as_png
+        try:
+            return get_canvas(driver).screenshot_as_png
+        except StaleElementReferenceException:
+            invalidate_canvas(driver)
+            return get_canvas(driver).screenshot_as_png
     except Exception as e:
         logger.error(f"Error getting screenshot: {e}")
         return b""
@@ -194,6 +254,7 @@ def click_start_llm(driver):
             EC.element_to_be_clickable((By.ID, "start-llm"))
         )
         btn.click()
+        invalidate_canvas(driver)
         logger.info("Clicked Start LLM button")
         time.sleep(1) # Wait for init
     except Exception as e:
@@ -207,6 +268,7 @@ def click_retry(driver):
             EC.element_to_be_clickable((By.ID, "retry"))
         )
         btn.click()
+        invalidate_canvas(driver)
         logger.info("Clicked Retry button")
         time.sleep(1) # Wait for reset
         return True
@@ -222,6 +284,7 @@ def click_next_instance(driver):
             EC.element_to_be_clickable((By.ID, "next"))
         )
         btn.click()
+        invalidate_canvas(driver)
         logger.info("Clicked Next Instance button")
         time.sleep(1)
         return True
@@ -1,109 +1,337 @@
 import base64
-import copy
+import hashlib
 import io
 import json
 import logging
 import os
+import queue
 import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from utils.llm_interface_utils.rich_logging import print_user_panel, print_assistant_panel
 from PIL import Image
 
+try:
+    import orjson
+except ImportError:
+    # orjson is optional; JSON files and JSONL records fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import pybase64
+except ImportError:
+    # pybase64 is optional; the stdlib encoder produces the same output
+    pybase64 = None
+
+try:
+    # numpy is a dependency of PyTurboJPEG and only needed on this path
+    import numpy as np
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _turbo_jpeg = TurboJPEG()
+except Exception:
+    # PyTurboJPEG (or the libjpeg-turbo library it loads) is optional; PIL encodes JPEGs otherwise
+    _turbo_jpeg = None
+
 logger = logging.getLogger(__name__)
 
-SUMMARY_PATTERN = re.compile(r"<summary>(.*?)</summary>", re.IGNORECASE | re.DOTALL)
-SCRATCHPAD_PATTERN = re.compile(r"<scratchpad>(.*?)</scratchpad>", re.IGNORECASE | re.DOTALL)
+# One pass over the LLM output finds both <summary> and <scratchpad> blocks
+TAGGED_PATTERN = re.compile(r"<(summary|scratchpad)>(.*?)</\1>", re.IGNORECASE | re.DOTALL)
+
+# Frames sent to the LLM are downscaled and JPEG-encoded; archived PNGs on disk stay full resolution
+LLM_FRAME_MIME_TYPE = "image/jpeg"
+LLM_FRAME_MAX_EDGE = 512
+LLM_FRAME_JPEG_QUALITY = 80
+
+# Resolved once: Image.LANCZOS is a deprecated alias of Image.Resampling.LANCZOS on Pillow >= 9.1
+_LANCZOS = getattr(Image, "Resampling", Image).LANCZOS
+
+# Recently encoded prompt payloads keyed by a digest of the raw capture; static screens (menus, game over,
+# pause) produce byte-identical captures, which then skip the decode/resize/encode pass
+FRAME_ENCODING_CACHE_SIZE = 16
+_frame_encoding_cache: "OrderedDict[tuple, str]" = OrderedDict()
+
+
+def _fast_clone(value: Any) -> Any:
+    """Copy the dict/list/tuple structure of a JSON-shaped value, sharing its immutable leaves."""
+    value_type = type(value)
+    if value_type is dict:
+        return {key: _fast_clone(item) for key, item in value.items()}
+    if value_type is list:
+        return [_fast_clone(item) for item in value]
+    if value_type is tuple:
+        return tuple(_fast_clone(item) for item in value)
+    return value
+
 
+def append_history_entry(entry: Dict[str, Any], full_history: List[Dict[str, Any]]) -> None:
+    """Append a copy of an entry to the archival history, so later edits to the entry don't leak into it."""
+    full_history.append(_fast_clone(entry))
 
-def append_history_entry(entry: Dict[str, Any], history: List[Dict[str, Any]], full_history: List[Dict[str, Any]]) -> None:
-    """Append an entry to both the active history and the archival history."""
-    history.append(entry)
-    full_history.append(copy.deepcopy(entry))
+
+def extract_tagged_blocks(text: str) -> Dict[str, str]:
+    """Return the first <summary> and <scratchpad> blocks in the supplied text, keyed by lowercase tag name."""
+    blocks: Dict[str, str] = {}
+    if not text:
+        return blocks
+    for match in TAGGED_PATTERN.finditer(text):
+        blocks.setdefault(match.group(1).lower(), match.group(2).strip())
+    return blocks
 
 
 def extract_summary_text(text: str) -> Optional[str]:
     """Return the <summary>...</summary> block from the supplied text, if present."""
-    if not text:
-        return None
-    match = SUMMARY_PATTERN.search(text)
-    if match:
-        return match.group(1).strip()
-    return None
+    return extract_tagged_blocks(text).get("summary")
 
 
 def extract_scratchpad_text(text: str) -> Optional[str]:
     """Return the <scratchpad>...</scratchpad> block from the supplied text, if present."""
-    if not text:
-        return None
-    match = SCRATCHPAD_PATTERN.search(text)
-    if match:
-        return match.group(1).strip()
-    return None
+    return extract_tagged_blocks(text).get("scratchpad")
+
+
+# Per-step screenshots, prompts and logs are written off the gameplay loop; paths are returned up front.
+# A step queues about four independent files (screenshot, prompt, action frames, step log), so they
+# get one worker each; the writes release the GIL in their syscalls and overlap.
+GAMEPLAY_IO_WORKERS = 4
+_io_pool = ThreadPoolExecutor(max_workers=GAMEPLAY_IO_WORKERS, thread_name_prefix="gameplay-io")
+_pending_writes: List[Future] = []
+
+
+def _collect_finished_writes() -> None:
+    """Log failures of completed background writes and keep only the ones still in flight."""
+    in_flight = []
+    for future in _pending_writes:
+        if not future.done():
+            in_flight.append(future)
+        elif future.exception() is not None:
+            logger.error(f"Error writing gameplay output: {future.exception()}")
+    _pending_writes[:] = in_flight
+
+
+def submit_write(fn: Any, *args: Any, **kwargs: Any) -> Future:
+    """Run a disk-writing call on the background IO pool and track it until flush_pending_writes()."""
+    _collect_finished_writes()
+    future = _io_pool.submit(fn, *args, **kwargs)
+    _pending_writes.append(future)
+    return future
+
+
+def flush_pending_writes() -> None:
+    """Block until every queued background write has finished, logging any that failed."""
+    wait(list(_pending_writes))
+    _collect_finished_writes()
+
+
+def _write_bytes(path: str, data: bytes) -> None:
+    """Write data to path with raw os.write calls, skipping the buffered file object for one-shot writes."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+# Directories already created this session, so per-step saves skip the makedirs syscall
+_created_dirs = set()
+
+
+def _ensure_dir(path: str) -> str:
+    """Create path (and parents) the first time it is seen this session and return it."""
+    if path not in _created_dirs:
+        os.makedirs(path, exist_ok=True)
+        _created_dirs.add(path)
+    return path
 
 
 def save_screenshot(results_dir: str, episode_count: int, step_count: int, screenshot_bytes: bytes, suffix: Optional[str] = None) -> str:
-    """Persist a screenshot PNG and return its path."""
+    """Queue a screenshot PNG write on the background IO pool and return its path."""
     try:
         suffix_part = f"_{suffix}" if suffix else ""
         filename = f"episode_{episode_count}_step_{step_count}{suffix_part}.png"
-        filepath = os.path.join(results_dir, "screenshots", filename)
-        with open(filepath, "wb") as file:
-            file.write(screenshot_bytes)
+        filepath = os.path.join(_ensure_dir(os.path.join(results_dir, "screenshots")), filename)
+        submit_write(_write_bytes, filepath, screenshot_bytes)
         return filepath
     except Exception as exc:
         logger.error(f"Error saving screenshot: {exc}")
         return ""
 
 
+def action_frame_path(gameplay_dir: str, frame_idx: int) -> str:
+    """Return the path save_action_frame writes a given frame index to."""
+    return os.path.join(gameplay_dir, f"frame_step_{frame_idx:05d}.png")
+
+
 def save_action_frame(gameplay_dir: str, frame_idx: int, screenshot_bytes: bytes) -> str:
     """Persist a post-action gameplay frame PNG and return its path."""
     try:
-        filename = f"frame_step_{frame_idx:05d}.png"
-        filepath = os.path.join(gameplay_dir, filename)
-        with open(filepath, "wb") as file:
-            file.write(screenshot_bytes)
+        filepath = action_frame_path(_ensure_dir(gameplay_dir), frame_idx)
+        _write_bytes(filepath, screenshot_bytes)
         return filepath
     except Exception as exc:
         logger.error(f"Error saving action frame: {exc}")
         return ""
 
 
-def build_frame_reference(path: Optional[str], image_bytes: Optional[bytes], mime_type: str = "image/png") -> Optional[Dict[str, Optional[str]]]:
-    """Create a serializable descriptor containing the image path and base64 payload."""
+class BackgroundFrameWriter:
+    """Write captured frames to disk on a daemon thread so capture pacing is not blocked by file IO."""
+
+    def __init__(self, max_pending: int = 256):
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="frame-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, path: str, data: bytes) -> None:
+        """Queue bytes to be written to path; blocks only if max_pending writes are outstanding."""
+        self._queue.put((path, data))
+
+    def close(self) -> None:
+        """Flush all queued writes and stop the writer thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            path, data = item
+            try:
+                _write_bytes(path, data)
+            except Exception as exc:
+                logger.debug(f"Frame write error (non-critical): {exc}")
+
+
+def build_frame_reference(
+    path: Optional[str],
+    image_bytes: Optional[bytes],
+    mime_type: str = LLM_FRAME_MIME_TYPE,
+    defer_encoding: bool = False,
+) -> Optional[Dict[str, Any]]:
+    """
+    Create a descriptor containing the image path and base64 payload (encoded as mime_type).
+    With defer_encoding, the raw bytes are kept and the payload is built on first use by frame_reference_base64.
+    """
     if not path and not image_bytes:
         return None
-    base64_data = base64.b64encode(
-        _prepare_image_for_base64(image_bytes, mime_type)
-    ).decode("utf-8") if image_bytes else None
-    return {
+    frame_ref = {
         "path": path,
-        "base64": base64_data,
+        "base64": None,
         "mime_type": mime_type,
+        "image_bytes": image_bytes,
     }
+    if not defer_encoding:
+        frame_reference_base64(frame_ref)
+    return frame_ref
+
+
+def frame_reference_base64(frame_ref: Dict[str, Any]) -> Optional[str]:
+    """Return the base64 payload of a frame reference, encoding it once and memoizing it on the descriptor."""
+    base64_data = frame_ref.get("base64")
+    if base64_data is None:
+        image_bytes = frame_ref.get("image_bytes")
+        if not image_bytes:
+            return None
+        mime_type = frame_ref.get("mime_type", LLM_FRAME_MIME_TYPE)
+        cache_key = (hashlib.blake2b(image_bytes, digest_size=16).digest(), mime_type)
+        cached = _frame_encoding_cache.get(cache_key)
+        if cached is None:
+            encoded_bytes, encoded_mime_type = _prepare_image_for_base64(image_bytes, mime_type)
+            cached = (_b64encode_str(encoded_bytes), encoded_mime_type)
+            _frame_encoding_cache[cache_key] = cached
+            if len(_frame_encoding_cache) > FRAME_ENCODING_CACHE_SIZE:
+                _frame_encoding_cache.popitem(last=False)
+        else:
+            _frame_encoding_cache.move_to_end(cache_key)
+        base64_data, frame_ref["mime_type"] = cached
+        frame_ref["base64"] = base64_data
+        # The raw capture is no longer needed once the payload exists
+        frame_ref["image_bytes"] = None
+    return base64_data
+
+
+def _b64encode_str(data: bytes) -> str:
+    """Base64-encode data straight to str, with the SIMD pybase64 encoder when available."""
+    if pybase64 is not None:
+        return pybase64.b64encode_as_string(data)
+    return base64.b64encode(data).decode("utf-8")
 
 
-def _prepare_image_for_base64(image_bytes: bytes, mime_type: str) -> bytes:
-    """Downscale the image so the smaller dimension is at most 256px before encoding."""
+def _encode_jpeg(image: Image.Image, quality: int) -> bytes:
+    """Encode an RGB image as JPEG, through libjpeg-turbo when available."""
+    if _turbo_jpeg is not None:
+        return _turbo_jpeg.encode(np.ascontiguousarray(np.asarray(image)), quality=quality, pixel_format=TJPF_RGB)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=False, progressive=False)
+    return buffer.getvalue()
+
+
+def _prepare_image_for_base64(
+    image_bytes: bytes,
+    mime_type: str,
+    max_edge: int = LLM_FRAME_MAX_EDGE,
+    quality: int = LLM_FRAME_JPEG_QUALITY,
+) -> Tuple[bytes, str]:
+    """
+    Downscale the image so the smaller dimension is at most 256px (and the larger at most max_edge),
+    then encode it as mime_type. Fewer pixels means fewer visual tokens per frame.
+    The output only feeds the prompt, so it favours encode speed over size; archived screenshots keep the raw bytes.
+    Returns the bytes with their actual mime type, which is the source's if re-encoding fails.
+    """
     if not image_bytes:
-        return image_bytes
+        return image_bytes, mime_type
     try:
         with Image.open(io.BytesIO(image_bytes)) as img:
             width, height = img.size
-            min_dim = min(width, height)
-            if min_dim <= 256:
-                return image_bytes
-            scale = 256 / float(min_dim)
-            new_size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
-            resized = img.resize(new_size, Image.LANCZOS)
-            buffer = io.BytesIO()
             format_name = "JPEG" if mime_type.lower() in ("image/jpeg", "image/jpg") else "PNG"
-            resized.save(buffer, format=format_name)
-            return buffer.getvalue()
+            scale = min(1.0, 256 / float(min(width, height)), max_edge / float(max(width, height)))
+            if scale >= 1.0 and img.format == format_name:
+                return image_bytes, mime_type
+            resized = img
+            if scale < 1.0:
+                new_size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+                # Box-reduce first, then LANCZOS over the last <=2x: near-identical output, far fewer taps
+                resized = img.resize(new_size, _LANCZOS, reducing_gap=2.0)
+            if format_name == "JPEG":
+                if resized.mode != "RGB":
+                    resized = resized.convert("RGB")
+                return _encode_jpeg(resized, quality), mime_type
+            buffer = io.BytesIO()
+            resized.save(buffer, format=format_name, optimize=False, compress_level=1)
+            return buffer.getvalue(), mime_type
     except Exception as exc:
         logger.warning(f"Failed to resize image for base64 encoding: {exc}")
-        return image_bytes
+        # The original bytes go out as-is, so label them with their own format
+        return image_bytes, ("image/jpeg" if image_bytes.startswith(b"\xff\xd8\xff") else "image/png")
+
+
+def _write_json(path: str, payload: Any) -> None:
+    """Write payload as indented JSON in one buffered write, stringifying values JSON cannot represent."""
+    if orjson is not None:
+        with open(path, "wb") as json_file:
+            json_file.write(orjson.dumps(payload, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        return
+    with open(path, "w", encoding="utf-8") as json_file:
+        json_file.write(json.dumps(payload, indent=2, ensure_ascii=False, default=str))
+
+
+def _payload_preview(value: Any, limit: int) -> Tuple[str, bool]:
+    """
+    Return (preview, truncated) with at most limit characters describing a prompt item, without
+    stringifying the whole of it, so multi-megabyte base64 payloads are sliced rather than copied.
+    """
+    if isinstance(value, dict):
+        payload = value.get("data") or value.get("url") or value.get("text")
+        if not isinstance(payload, str):
+            return f"<{type(value).__name__} with keys: {', '.join(map(str, value.keys()))}>"[:limit], False
+        value = payload
+    elif not isinstance(value, str):
+        return f"<{type(value).__name__}>", False
+    return value[:limit], len(value) > limit
 
 
 def save_prompt(results_dir: str, step_count: int, episode_count: int, content: List[Dict[str, Any]]) -> str:
@@ -119,8 +347,7 @@ def save_prompt(results_dir: str, step_count: int, episode_count: int, content:
     Returns:
         Path to the saved prompt file
     """
-    prompts_dir = os.path.join(results_dir, "prompts")
-    os.makedirs(prompts_dir, exist_ok=True)
+    prompts_dir = _ensure_dir(os.path.join(results_dir, "prompts"))
     
     prompt_path = os.path.join(prompts_dir, f"episode_{episode_count}_step_{step_count}_prompt.json")
     
@@ -135,13 +362,15 @@ def save_prompt(results_dir: str, step_count: int, episode_count: int, content:
             })
         elif item_type == "image_base64":
             # Base64 image - save metadata but truncate base64 data for readability
-            base64_data = item.get("data", "")
+            base64_data = item.get("data") or ""
+            base64_length = len(base64_data)
             mime_type = item.get("mime_type", "image/png")
             serializable_content.append({
                 "type": "image_base64",
                 "mime_type": mime_type,
-                "base64_length": len(base64_data) if base64_data else 0,
-                "base64_preview": base64_data[:100] + "..." if base64_data and len(base64_data) > 100 else base64_data,
+                "base64_length": base64_length,
+                "base64_preview": base64_data[:100],
+                "truncated": base64_length > 100,
                 "note": "Full base64 data truncated for readability"
             })
         elif item_type == "image_url" or item_type == "image":
@@ -155,7 +384,8 @@ def save_prompt(results_dir: str, step_count: int, episode_count: int, content:
                         "type": "image_url",
                         "format": "base64_data_url",
                         "mime_type": image_info.get("mime_type", "unknown"),
-                        "url_preview": url[:200] + "..." if len(url) > 200 else url,
+                        "url_preview": url[:200],
+                        "truncated": len(url) > 200,
                         "note": "Base64 image data (truncated in JSON)"
                     })
                 else:
@@ -165,15 +395,19 @@ def save_prompt(results_dir: str, step_count: int, episode_count: int, content:
                         "path": url
                     })
             else:
+                preview, truncated = _payload_preview(image_info, 100)
                 serializable_content.append({
                     "type": "image_url",
-                    "data": str(image_info)[:100] + "..." if len(str(image_info)) > 100 else str(image_info)
+                    "data": preview,
+                    "truncated": truncated
                 })
         else:
-            # Unknown type, save as-is (with truncation for large data)
+            # Unknown type, save a truncated preview of its payload
+            preview, truncated = _payload_preview(item, 500)
             serializable_content.append({
                 "type": item.get("type", "unknown"),
-                "data": str(item)[:500] + "..." if len(str(item)) > 500 else str(item)
+                "data": preview,
+                "truncated": truncated
             })
     
     prompt_data = {
@@ -183,25 +417,75 @@ def save_prompt(results_dir: str, step_count: int, episode_count: int, content:
         "content": serializable_content
     }
     
-    with open(prompt_path, "w", encoding="utf-8") as f:
-        json.dump(prompt_data, f, indent=2, ensure_ascii=False)
+    _write_json(prompt_path, prompt_data)
     
     logger.info(f"Saved prompt to {prompt_path}")
     return prompt_path
 
 
-def save_results(results_dir: str, content_history: List[Dict[str, Any]], gameplay_log: List[Dict[str, Any]]) -> None:
-    """Write content history and gameplay logs to disk."""
+def open_jsonl_log(path: str) -> Any:
+    """Open a line-buffered JSONL file for appending, so every record reaches disk as it is written."""
+    return open(path, "a", buffering=1, encoding="utf-8")
+
+
+def append_jsonl_record(log_file: Any, record: Dict[str, Any]) -> None:
+    """Append one record to an open JSONL file so partial runs keep their log."""
+    try:
+        if orjson is not None:
+            line = orjson.dumps(record, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        else:
+            line = json.dumps(record, default=str)
+        log_file.write(line + "\n")
+    except Exception as exc:
+        logger.error(f"Error appending JSONL record: {exc}")
+
+
+def _jsonl_to_json_array(jsonl_path: str, json_path: str, expected_records: int) -> bool:
+    """
+    Write the records of a JSONL file as a JSON array by splicing the already-encoded lines,
+    without decoding or re-encoding them. Returns False (writing nothing) if the record count differs.
+    """
+    with open(jsonl_path, "r", encoding="utf-8") as jsonl_file:
+        if sum(1 for line in jsonl_file if line.strip()) != expected_records:
+            return False
+        jsonl_file.seek(0)
+        with open(json_path, "w", encoding="utf-8") as json_file:
+            json_file.write("[")
+            separator = "\n"
+            for line in jsonl_file:
+                line = line.strip()
+                if line:
+                    json_file.write(separator)
+                    json_file.write(line)
+                    separator = ",\n"
+            json_file.write("\n]\n")
+    return True
+
+
+def save_results(
+    results_dir: str,
+    content_history: List[Dict[str, Any]],
+    gameplay_log: List[Dict[str, Any]],
+    content_history_jsonl: Optional[str] = None,
+) -> None:
+    """
+    Write content history and gameplay logs to disk.
+    When the turns were already streamed to content_history_jsonl, those encoded records are reused.
+    """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
     content_path = os.path.join(results_dir, f"content_history_{timestamp}.json")
-    with open(content_path, "w") as content_file:
-        serializable_history = json.loads(json.dumps(content_history, default=str))
-        json.dump(serializable_history, content_file, indent=2)
+    reused_stream = False
+    if content_history_jsonl and os.path.exists(content_history_jsonl):
+        try:
+            reused_stream = _jsonl_to_json_array(content_history_jsonl, content_path, len(content_history))
+        except Exception as exc:
+            logger.warning(f"Could not reuse streamed content history, re-encoding it: {exc}")
+    if not reused_stream:
+        _write_json(content_path, content_history)
 
     gameplay_path = os.path.join(results_dir, f"gameplay_log_{timestamp}.json")
-    with open(gameplay_path, "w") as log_file:
-        json.dump(gameplay_log, log_file, indent=2)
+    _write_json(gameplay_path, gameplay_log)
 
     logger.info(f"Results saved to {results_dir}")
 
@@ -237,8 +521,7 @@ def record_gameplay_step(
         step_payload["score"] = score
     if token_usage:
         step_payload["token_usage"] = token_usage
-    step_path = os.path.join(gameplay_dir, f"episode_{episode}_step_{step}.json")
-    with open(step_path, "w") as step_file:
-        json.dump(step_payload, step_file, indent=2)
+    step_path = os.path.join(_ensure_dir(gameplay_dir), f"episode_{episode}_step_{step}.json")
+    _write_json(step_path, step_payload)
 
 
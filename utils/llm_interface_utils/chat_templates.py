@@ -2,7 +2,8 @@
 Chat template utilities for different models and thinking modes.
 """
 
-from typing import Dict, List, Optional, Union
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,6 +27,42 @@ def get_thinking_template(model_name: str) -> Optional[str]:
     """Get the thinking template for a model."""
     return THINKING_MODELS.get(model_name)
 
+@lru_cache(maxsize=128)
+def _resolve_family(model_name: str) -> Optional[str]:
+    """Resolve the chat template family ("llama", "qwen", "deepseek") for a model name, once per name."""
+    model_name_lower = model_name.lower()
+    if "llama" in model_name_lower:
+        return "llama"
+    if "qwen" in model_name_lower:
+        return "qwen"
+    if "deepseek" in model_name_lower:
+        return "deepseek"
+    return None
+
+@lru_cache(maxsize=8)
+def _llama_affixes(system_prompt: Optional[str]) -> Tuple[str, str]:
+    """Return the manual Llama template text before and after the user prompt."""
+    if system_prompt:
+        prefix = f"<|begin_of_text|><|start_header_id|>system<|end_header_id|>\n\n{system_prompt}<|eot_id|><|start_header_id|>user<|end_header_id|>\n\n"
+    else:
+        prefix = "<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n\n"
+    return prefix, "<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n\n"
+
+# Appended after the generation prompt when DeepSeek thinking mode is enabled
+DEEPSEEK_THINKING_SUFFIX = "I need to think about this step by step.\n\n<think>\n"
+
+@lru_cache(maxsize=8)
+def _chatml_affixes(system_prompt: Optional[str], enable_thinking: bool = False) -> Tuple[str, str]:
+    """Return the manual ChatML (Qwen/DeepSeek) template text before and after the user prompt."""
+    if system_prompt:
+        prefix = f"<|im_start|>system\n{system_prompt}<|im_end|>\n<|im_start|>user\n"
+    else:
+        prefix = "<|im_start|>user\n"
+    suffix = "<|im_end|>\n<|im_start|>assistant\n"
+    if enable_thinking:
+        suffix += DEEPSEEK_THINKING_SUFFIX
+    return prefix, suffix
+
 def apply_chat_template(
     prompt: str,
     model_name: str,
@@ -53,16 +90,17 @@ def apply_chat_template(
     }
     
     # Check if thinking is requested but not supported
-    if enable_thinking and not supports_thinking(model_name):
+    if enable_thinking and model_name not in THINKING_MODELS:
         logger.warning(f"Thinking mode requested but not supported for {model_name}")
         enable_thinking = False
     
     # Handle different model families
-    if "llama" in model_name.lower() or "meta-llama" in model_name.lower():
+    family = _resolve_family(model_name)
+    if family == "llama":
         result.update(_apply_llama_template(prompt, tokenizer, system_prompt))
-    elif "qwen" in model_name.lower():
+    elif family == "qwen":
         result.update(_apply_qwen_template(prompt, tokenizer, system_prompt))
-    elif "deepseek" in model_name.lower():
+    elif family == "deepseek":
         result.update(_apply_deepseek_template(prompt, tokenizer, enable_thinking, system_prompt))
     else:
         # Default template for unknown models
@@ -101,10 +139,8 @@ def _apply_llama_template(
             logger.warning(f"Failed to apply Llama chat template: {e}")
     
     # Fallback to manual template
-    if system_prompt:
-        formatted = f"<|begin_of_text|><|start_header_id|>system<|end_header_id|>\n\n{system_prompt}<|eot_id|><|start_header_id|>user<|end_header_id|>\n\n{prompt}<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n\n"
-    else:
-        formatted = f"<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n\n{prompt}<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n\n"
+    prefix, suffix = _llama_affixes(system_prompt)
+    formatted = "".join((prefix, prompt, suffix))
     
     return {
         "formatted_prompt": formatted,
@@ -137,10 +173,8 @@ def _apply_qwen_template(
             logger.warning(f"Failed to apply Qwen chat template: {e}")
     
     # Fallback to manual template
-    if system_prompt:
-        formatted = f"<|im_start|>system\n{system_prompt}<|im_end|>\n<|im_start|>user\n{prompt}<|im_end|>\n<|im_start|>assistant\n"
-    else:
-        formatted = f"<|im_start|>user\n{prompt}<|im_end|>\n<|im_start|>assistant\n"
+    prefix, suffix = _chatml_affixes(system_prompt)
+    formatted = "".join((prefix, prompt, suffix))
     
     return {
         "formatted_prompt": formatted,
@@ -169,7 +203,7 @@ def _apply_deepseek_template(
             
             # Add thinking instruction if enabled
             if enable_thinking:
-                formatted += "I need to think about this step by step.\n\n<think>\n"
+                formatted += DEEPSEEK_THINKING_SUFFIX
             
             return {
                 "formatted_prompt": formatted,
@@ -179,13 +213,8 @@ def _apply_deepseek_template(
             logger.warning(f"Failed to apply DeepSeek chat template: {e}")
     
     # Fallback to manual template
-    if system_prompt:
-        formatted = f"<|im_start|>system\n{system_prompt}<|im_end|>\n<|im_start|>user\n{prompt}<|im_end|>\n<|im_start|>assistant\n"
-    else:
-        formatted = f"<|im_start|>user\n{prompt}<|im_end|>\n<|im_start|>assistant\n"
-    
-    if enable_thinking:
-        formatted += "I need to think about this step by step.\n\n<think>\n"
+    prefix, suffix = _chatml_affixes(system_prompt, enable_thinking)
+    formatted = "".join((prefix, prompt, suffix))
     
     return {
         "formatted_prompt": formatted,
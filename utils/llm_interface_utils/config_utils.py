@@ -3,16 +3,79 @@ Configuration utilities for LLM interfaces.
 """
 
 import os
+import re
+import copy
 import json
-from typing import Dict, Any, Optional, Union, List
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple, Union, List
 from omegaconf import OmegaConf, DictConfig
+import yaml
 import logging
 
 logger = logging.getLogger(__name__)
 
+# YAML 1.2-style floats ("1e-5" without a dot), matching the resolver OmegaConf installs on its own loader
+_YAML_FLOAT_PATTERN = re.compile(
+    r"""^(?:
+     [-+]?[0-9]+(?:_[0-9]+)*\.[0-9_]*(?:[eE][-+]?[0-9]+)?
+    |[-+]?[0-9]+(?:_[0-9]+)*(?:[eE][-+]?[0-9]+)
+    |\.[0-9]+(?:_[0-9]+)*(?:[eE][-+][0-9]+)?
+    |[-+]?[0-9]+(?:_[0-9]+)*(?::[0-5]?[0-9])+\.[0-9_]*
+    |[-+]?\.(?:inf|Inf|INF)
+    |\.(?:nan|NaN|NAN))$""",
+    re.X,
+)
+
+if hasattr(yaml, "CSafeLoader"):
+    class _CConfigLoader(yaml.CSafeLoader):
+        """libyaml-backed safe loader that resolves scalars and rejects duplicate keys the way OmegaConf.load does."""
+
+        def construct_mapping(self, node, deep=False):
+            seen = set()
+            for key_node, _ in node.value:
+                if key_node.tag != yaml.resolver.BaseResolver.DEFAULT_SCALAR_TAG:
+                    continue
+                if key_node.value in seen:
+                    raise yaml.constructor.ConstructorError(
+                        "while constructing a mapping",
+                        node.start_mark,
+                        f"found duplicate key {key_node.value}",
+                        key_node.start_mark,
+                    )
+                seen.add(key_node.value)
+            return super().construct_mapping(node, deep=deep)
+
+    _CConfigLoader.add_implicit_resolver("tag:yaml.org,2002:float", _YAML_FLOAT_PATTERN, list("-+0123456789."))
+    # OmegaConf keeps timestamps as strings
+    _CConfigLoader.yaml_implicit_resolvers = {
+        key: [(tag, regexp) for tag, regexp in resolvers if tag != "tag:yaml.org,2002:timestamp"]
+        for key, resolvers in _CConfigLoader.yaml_implicit_resolvers.items()
+    }
+else:
+    # PyYAML built without libyaml; OmegaConf.load's pure-Python loader is used instead
+    _CConfigLoader = None
+
+def _parse_config_file(path: str) -> DictConfig:
+    """Parse a YAML config with the libyaml C loader when available, else with OmegaConf.load."""
+    if _CConfigLoader is None:
+        return OmegaConf.load(path)
+    with open(path, "r", encoding="utf-8") as config_file:
+        data = yaml.load(config_file, Loader=_CConfigLoader)
+    if data is None:
+        return OmegaConf.create()
+    return OmegaConf.create(data)
+
+# Parsed configs keyed by absolute path; an entry is reused only while the file's (mtime, size) is unchanged
+_CONFIG_CACHE_MAX_ENTRIES = 128
+_config_cache: "OrderedDict[str, Tuple[int, int, DictConfig]]" = OrderedDict()
+_config_cache_lock = threading.Lock()
+
 def load_config(config_path: str) -> DictConfig:
     """
     Load configuration from YAML file using OmegaConf.
+    Parsed files are cached and revalidated by modification time and size; callers get their own copy.
     
     Args:
         config_path: Path to the YAML configuration file
@@ -20,14 +83,40 @@ def load_config(config_path: str) -> DictConfig:
     Returns:
         OmegaConf configuration object
     """
-    if not os.path.exists(config_path):
+    abs_path = os.path.abspath(config_path)
+    try:
+        stat = os.stat(abs_path)
+    except FileNotFoundError:
         raise FileNotFoundError(f"Configuration file not found: {config_path}")
     
+    with _config_cache_lock:
+        cached = _config_cache.get(abs_path)
+        if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            _config_cache.move_to_end(abs_path)
+            return copy.deepcopy(cached[2])
+    
     try:
-        config = OmegaConf.load(config_path)
-        return config
+        config = _parse_config_file(abs_path)
     except Exception as e:
         raise ValueError(f"Failed to load configuration from {config_path}: {e}")
+    
+    with _config_cache_lock:
+        _config_cache[abs_path] = (stat.st_mtime_ns, stat.st_size, config)
+        _config_cache.move_to_end(abs_path)
+        if len(_config_cache) > _CONFIG_CACHE_MAX_ENTRIES:
+            _config_cache.popitem(last=False)
+    return copy.deepcopy(config)
+
+# name -> (accepted types, cast, inclusive minimum, inclusive maximum or None)
+_NUMERIC_PARAM_SPECS = {
+    'temperature': ((int, float), float, 0, 2),
+    'top_p': ((int, float), float, 0, 1),
+    'top_k': (int, int, 1, None),
+    'max_tokens': (int, int, 1, None),
+    # HuggingFace name for max_tokens
+    'max_new_tokens': (int, int, 1, None),
+}
+
 
 def validate_generation_params(params: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -41,50 +130,17 @@ def validate_generation_params(params: Dict[str, Any]) -> Dict[str, Any]:
     """
     validated = {}
     
-    # Temperature validation
-    if 'temperature' in params:
-        temp = params['temperature']
-        if temp is not None:
-            if not isinstance(temp, (int, float)) or temp < 0 or temp > 2:
-                logger.warning(f"Invalid temperature {temp}, using default")
-            else:
-                validated['temperature'] = float(temp)
-    
-    # Top-p validation
-    if 'top_p' in params:
-        top_p = params['top_p']
-        if top_p is not None:
-            if not isinstance(top_p, (int, float)) or top_p < 0 or top_p > 1:
-                logger.warning(f"Invalid top_p {top_p}, using default")
-            else:
-                validated['top_p'] = float(top_p)
-    
-    # Top-k validation
-    if 'top_k' in params:
-        top_k = params['top_k']
-        if top_k is not None:
-            if not isinstance(top_k, int) or top_k < 1:
-                logger.warning(f"Invalid top_k {top_k}, using default")
-            else:
-                validated['top_k'] = int(top_k)
-    
-    # Max tokens validation
-    if 'max_tokens' in params:
-        max_tokens = params['max_tokens']
-        if max_tokens is not None:
-            if not isinstance(max_tokens, int) or max_tokens < 1:
-                logger.warning(f"Invalid max_tokens {max_tokens}, using default")
-            else:
-                validated['max_tokens'] = int(max_tokens)
-    
-    # Max new tokens validation (for HuggingFace)
-    if 'max_new_tokens' in params:
-        max_new_tokens = params['max_new_tokens']
-        if max_new_tokens is not None:
-            if not isinstance(max_new_tokens, int) or max_new_tokens < 1:
-                logger.warning(f"Invalid max_new_tokens {max_new_tokens}, using default")
-            else:
-                validated['max_new_tokens'] = int(max_new_tokens)
+    # Range-checked numeric parameters
+    for name, (allowed_types, cast, low, high) in _NUMERIC_PARAM_SPECS.items():
+        value = params.get(name)
+        if value is None:
+            continue
+        if (not isinstance(value, allowed_types)
+                or value < low
+                or (high is not None and value > high)):
+            logger.warning(f"Invalid {name} {value}, using default")
+        else:
+            validated[name] = cast(value)
     
     # Do sample validation
     if 'do_sample' in params:
@@ -102,6 +158,25 @@ def validate_generation_params(params: Dict[str, Any]) -> Dict[str, Any]:
     
     return validated
 
+_BASE_DEFAULTS = {
+    'temperature': 0.7,
+    'top_p': 0.9,
+    'max_tokens': 512,
+    'do_sample': True
+}
+
+# Model-specific defaults, checked in order against the lowercased model name; the first match wins
+_FAMILY_DEFAULTS = (
+    ('llama', {'temperature': 0.6, 'top_p': 0.9, 'max_tokens': 512}),
+    ('qwen', {'temperature': 0.7, 'top_p': 0.8, 'max_tokens': 512}),
+    ('deepseek', {'temperature': 0.7, 'top_p': 0.95, 'max_tokens': 1024}),
+    ('gpt', {'temperature': 1.0, 'top_p': 1.0, 'max_tokens': 512}),
+    ('claude', {'temperature': 1.0, 'top_p': 1.0, 'max_tokens': 512}),
+    ('gemini', {'temperature': 0.9, 'top_p': 1.0, 'max_tokens': 512}),
+    ('glm', {'temperature': 0.7, 'top_p': 0.9, 'max_tokens': 2048}),
+    ('grok', {'temperature': 0.7, 'top_p': 0.9, 'max_tokens': 2048}),
+)
+
 def get_model_defaults(model_name: str) -> Dict[str, Any]:
     """
     Get default generation parameters for a specific model.
@@ -112,76 +187,11 @@ def get_model_defaults(model_name: str) -> Dict[str, Any]:
     Returns:
         Dictionary of default parameters
     """
-    defaults = {
-        'temperature': 0.7,
-        'top_p': 0.9,
-        'max_tokens': 512,
-        'do_sample': True
-    }
-    
-    # Model-specific defaults
-    if 'llama' in model_name.lower():
-        defaults.update({
-            'temperature': 0.6,
-            'top_p': 0.9,
-            'max_tokens': 512
-        })
-    elif 'qwen' in model_name.lower():
-        defaults.update({
-            'temperature': 0.7,
-            'top_p': 0.8,
-            'max_tokens': 512
-        })
-    elif 'deepseek' in model_name.lower():
-        defaults.update({
-            'temperature': 0.7,
-            'top_p': 0.95,
-            'max_tokens': 1024
-        })
-    elif 'gpt' in model_name.lower():
-        defaults.update({
-            'temperature': 1.0,
-            'top_p': 1.0,
-            'max_tokens': 512
-        })
-    elif 'claude' in model_name.lower():
-        defaults.update({
-            'temperature': 1.0,
-            'top_p': 1.0,
-            'max_tokens': 512
-        })
-    elif 'gemini' in model_name.lower():
-        defaults.update({
-            'temperature': 0.9,
-            'top_p': 1.0,
-            'max_tokens': 512
-        })
-    elif 'qwen' in model_name.lower() and ('together' in model_name.lower() or 'Qwen3' in model_name):
-        defaults.update({
-            'temperature': 0.7,
-            'top_p': 0.8,
-            'max_tokens': 2048
-        })
-    elif 'llama' in model_name.lower() and ('together' in model_name.lower() or 'Maverick' in model_name):
-        defaults.update({
-            'temperature': 0.6,
-            'top_p': 0.9,
-            'max_tokens': 2048
-        })
-    elif 'glm' in model_name.lower():
-        defaults.update({
-            'temperature': 0.7,
-            'top_p': 0.9,
-            'max_tokens': 2048
-        })
-    elif 'grok' in model_name.lower():
-        defaults.update({
-            'temperature': 0.7,
-            'top_p': 0.9,
-            'max_tokens': 2048
-        })
-    
-    return defaults
+    name_lower = model_name.lower()
+    for family, family_defaults in _FAMILY_DEFAULTS:
+        if family in name_lower:
+            return {**_BASE_DEFAULTS, **family_defaults}
+    return dict(_BASE_DEFAULTS)
 
 def merge_configs(base_config: DictConfig, override_config: Optional[DictConfig] = None) -> DictConfig:
     """
@@ -232,6 +242,32 @@ def validate_structured_output_params(params: Dict[str, Any]) -> Dict[str, Any]:
     
     return validated
 
+def _validate_json_schema_format(response_format: Dict[str, Any]) -> Union[Dict[str, Any], str]:
+    """Validate a {'type': 'json_schema', ...} response_format dict."""
+    if 'json_schema' not in response_format:
+        logger.warning("Invalid json_schema format, missing 'json_schema' field")
+        return 'text'
+    schema = response_format['json_schema']
+    if not (isinstance(schema, dict) and 'schema' in schema):
+        logger.warning("Invalid json_schema format, missing 'schema' field")
+        return 'text'
+    # Ensure additionalProperties is set to false for OpenAI strict mode
+    schema_def = schema['schema']
+    if isinstance(schema_def, dict) and 'additionalProperties' not in schema_def:
+        schema_def['additionalProperties'] = False
+    return response_format
+
+def _accept_format(response_format: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a response_format whose type needs no further checks."""
+    return response_format
+
+# response_format dict 'type' -> validator
+_FORMAT_VALIDATORS = {
+    'text': _accept_format,
+    'json_object': _accept_format,
+    'json_schema': _validate_json_schema_format,
+}
+
 def validate_response_format(response_format: Union[Dict[str, Any], str]) -> Union[Dict[str, Any], str]:
     """
     Validate OpenAI response_format parameter.
@@ -250,25 +286,10 @@ def validate_response_format(response_format: Union[Dict[str, Any], str]) -> Uni
             return 'text'
     
     elif isinstance(response_format, dict):
-        # Validate JSON schema format
-        if 'type' in response_format:
-            if response_format['type'] == 'json_schema':
-                if 'json_schema' in response_format:
-                    schema = response_format['json_schema']
-                    if isinstance(schema, dict) and 'schema' in schema:
-                        # Ensure additionalProperties is set to false for OpenAI strict mode
-                        schema_def = schema['schema']
-                        if isinstance(schema_def, dict) and 'additionalProperties' not in schema_def:
-                            schema_def['additionalProperties'] = False
-                        return response_format
-                    else:
-                        logger.warning("Invalid json_schema format, missing 'schema' field")
-                        return 'text'
-                else:
-                    logger.warning("Invalid json_schema format, missing 'json_schema' field")
-                    return 'text'
-            elif response_format['type'] in ['text', 'json_object']:
-                return response_format
+        format_type = response_format.get('type')
+        validator = _FORMAT_VALIDATORS.get(format_type) if isinstance(format_type, str) else None
+        if validator is not None:
+            return validator(response_format)
         
         logger.warning(f"Invalid response_format dict {response_format}, using 'text'")
         return 'text'
@@ -277,6 +298,15 @@ def validate_response_format(response_format: Union[Dict[str, Any], str]) -> Uni
         logger.warning(f"Invalid response_format type {type(response_format)}, using 'text'")
         return 'text'
 
+@lru_cache(maxsize=256)
+def _try_compile(pattern: str) -> Optional[str]:
+    """Compile a regex once per distinct pattern; return None if it is valid, else the error message."""
+    try:
+        re.compile(pattern)
+        return None
+    except re.error as e:
+        return str(e)
+
 def validate_guided_param(param_name: str, param_value: Any) -> Any:
     """
     Validate vLLM guided decoding parameters.
@@ -304,13 +334,11 @@ def validate_guided_param(param_name: str, param_value: Any) -> Any:
     
     elif param_name == 'guided_regex':
         if isinstance(param_value, str):
-            try:
-                import re
-                re.compile(param_value)
+            error = _try_compile(param_value)
+            if error is None:
                 return param_value
-            except re.error as e:
-                logger.warning(f"Invalid regex pattern: {param_value}, error: {e}")
-                return None
+            logger.warning(f"Invalid regex pattern: {param_value}, error: {error}")
+            return None
         else:
             logger.warning(f"Invalid type for guided_regex: {type(param_value)}")
             return None
@@ -335,13 +363,11 @@ def validate_guided_param(param_name: str, param_value: Any) -> Any:
     
     elif param_name == 'guided_whitespace_pattern':
         if isinstance(param_value, str):
-            try:
-                import re
-                re.compile(param_value)
+            error = _try_compile(param_value)
+            if error is None:
                 return param_value
-            except re.error as e:
-                logger.warning(f"Invalid whitespace pattern: {param_value}, error: {e}")
-                return None
+            logger.warning(f"Invalid whitespace pattern: {param_value}, error: {error}")
+            return None
         else:
             logger.warning(f"Invalid type for guided_whitespace_pattern: {type(param_value)}")
             return None
@@ -361,24 +387,34 @@ def make_openai_compatible_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
     if not isinstance(schema, dict):
         return schema
     
-    # Create a deep copy to avoid modifying the original
-    import copy
-    compatible_schema = copy.deepcopy(schema)
-    
-    def ensure_additional_properties_false(obj):
-        """Recursively ensure additionalProperties is false for all objects."""
-        if isinstance(obj, dict):
-            if obj.get('type') == 'object':
-                obj['additionalProperties'] = False
-            
-            # Recursively process nested objects
-            for key, value in obj.items():
+    # Walk with an explicit stack of (source, copy) pairs instead of recursing;
+    # builds a new tree, so the original schema is never modified
+    compatible_schema = {}
+    stack = [(schema, compatible_schema)]
+    while stack:
+        src, dst = stack.pop()
+        if isinstance(src, dict):
+            for key, value in src.items():
                 if isinstance(value, dict):
-                    ensure_additional_properties_false(value)
+                    child = dst[key] = {}
+                    stack.append((value, child))
                 elif isinstance(value, list):
-                    for item in value:
-                        if isinstance(item, dict):
-                            ensure_additional_properties_false(item)
+                    child = dst[key] = []
+                    stack.append((value, child))
+                else:
+                    dst[key] = value
+            if src.get('type') == 'object':
+                dst['additionalProperties'] = False
+        else:
+            for item in src:
+                if isinstance(item, dict):
+                    child = {}
+                    stack.append((item, child))
+                    dst.append(child)
+                elif isinstance(item, list):
+                    # Lists nested in lists are copied but not descended into
+                    dst.append(copy.deepcopy(item))
+                else:
+                    dst.append(item)
     
-    ensure_additional_properties_false(compatible_schema)
     return compatible_schema
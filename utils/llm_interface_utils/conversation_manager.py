@@ -7,11 +7,19 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Speaker labels used when flattening the conversation into a single prompt
+_ROLE_PREFIX = {"system": "System: ", "user": "User: ", "assistant": "Assistant: "}
+
 class ConversationManager:
     """
     Manages conversation history for multi-turn chat across different LLM providers.
     """
     
+    __slots__ = (
+        'model_name', 'system_prompt', 'messages',
+        '_has_system', '_last_user_idx', '_last_assistant_idx',
+    )
+    
     def __init__(self, model_name: str, system_prompt: Optional[str] = None):
         """
         Initialize conversation manager.
@@ -23,6 +31,11 @@ class ConversationManager:
         self.model_name = model_name
         self.system_prompt = system_prompt
         self.messages: List[Dict[str, str]] = []
+        # The system message, when present, is always messages[0]
+        self._has_system = bool(system_prompt)
+        # Positions of the latest user/assistant messages (-1 when there is none)
+        self._last_user_idx = -1
+        self._last_assistant_idx = -1
         
         # Add system message if provided
         if system_prompt:
@@ -30,10 +43,12 @@ class ConversationManager:
     
     def add_user_message(self, content: str) -> None:
         """Add a user message to the conversation."""
+        self._last_user_idx = len(self.messages)
         self.messages.append({"role": "user", "content": content})
     
     def add_assistant_message(self, content: str) -> None:
         """Add an assistant message to the conversation."""
+        self._last_assistant_idx = len(self.messages)
         self.messages.append({"role": "assistant", "content": content})
     
     def get_messages(self) -> List[Dict[str, str]]:
@@ -56,8 +71,9 @@ class ConversationManager:
         
         elif provider == 'anthropic':
             # Anthropic separates system prompt from messages
-            messages = [msg for msg in self.messages if msg['role'] != 'system']
-            return messages
+            if self._has_system:
+                return self.messages[1:]
+            return self.messages[:]
         
         elif provider == 'google':
             # Google Gemini uses a different format - convert to single prompt
@@ -75,45 +91,26 @@ class ConversationManager:
         """Get system prompt for APIs that handle it separately."""
         if provider == 'anthropic':
             # Anthropic handles system prompt separately
-            for msg in self.messages:
-                if msg['role'] == 'system':
-                    return msg['content']
+            if self._has_system:
+                return self.messages[0]['content']
         return None
     
+    def _format_as_prompt(self) -> str:
+        """Flatten the conversation into role-prefixed paragraphs."""
+        return "\n\n".join(
+            f"{_ROLE_PREFIX[msg['role']]}{msg['content']}"
+            for msg in self.messages
+            if msg['role'] in _ROLE_PREFIX
+        )
+    
     def _format_for_google(self) -> str:
         """Format conversation for Google Gemini as a single prompt."""
-        formatted_parts = []
-        
-        for msg in self.messages:
-            role = msg['role']
-            content = msg['content']
-            
-            if role == 'system':
-                formatted_parts.append(f"System: {content}")
-            elif role == 'user':
-                formatted_parts.append(f"User: {content}")
-            elif role == 'assistant':
-                formatted_parts.append(f"Assistant: {content}")
-        
-        return "\n\n".join(formatted_parts)
+        return self._format_as_prompt()
     
     def _format_for_local(self) -> str:
         """Format conversation for local models as a single prompt."""
         # This will be used with chat templates
-        formatted_parts = []
-        
-        for msg in self.messages:
-            role = msg['role']
-            content = msg['content']
-            
-            if role == 'system':
-                formatted_parts.append(f"System: {content}")
-            elif role == 'user':
-                formatted_parts.append(f"User: {content}")
-            elif role == 'assistant':
-                formatted_parts.append(f"Assistant: {content}")
-        
-        return "\n\n".join(formatted_parts)
+        return self._format_as_prompt()
     
     def clear_conversation(self) -> None:
         """Clear all messages except system prompt."""
@@ -121,6 +118,8 @@ class ConversationManager:
             self.messages = [{"role": "system", "content": self.system_prompt}]
         else:
             self.messages = []
+        self._last_user_idx = -1
+        self._last_assistant_idx = -1
     
     def get_conversation_length(self) -> int:
         """Get the number of messages in conversation."""
@@ -128,14 +127,12 @@ class ConversationManager:
     
     def get_last_user_message(self) -> Optional[str]:
         """Get the content of the last user message."""
-        for msg in reversed(self.messages):
-            if msg['role'] == 'user':
-                return msg['content']
-        return None
+        if self._last_user_idx < 0:
+            return None
+        return self.messages[self._last_user_idx]['content']
     
     def get_last_assistant_message(self) -> Optional[str]:
         """Get the content of the last assistant message."""
-        for msg in reversed(self.messages):
-            if msg['role'] == 'assistant':
-                return msg['content']
-        return None
+        if self._last_assistant_idx < 0:
+            return None
+        return self.messages[self._last_assistant_idx]['content']
@@ -2,7 +2,9 @@
 Model utilities for LLM interfaces.
 """
 
-from typing import Dict, Any, Optional
+import sys
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -215,6 +217,34 @@ MODEL_INFO = {
     }
 }
 
+# Intern the names so lookups with an interned model name match on identity before comparing text
+MODEL_INFO = {sys.intern(name): info for name, info in MODEL_INFO.items()}
+
+# Read-only views of the entries, shared by the accessors below instead of copying each entry
+_MODEL_INFO_VIEWS = {name: MappingProxyType(info) for name, info in MODEL_INFO.items()}
+
+# Case-insensitive fallback index, so "Qwen/QWEN3-..." style spellings resolve to the same entry
+_MODEL_INFO_LOWER = {name.lower(): info for name, info in _MODEL_INFO_VIEWS.items()}
+
+# Read-only info returned for models missing from MODEL_INFO
+_DEFAULT_INFO = MappingProxyType({
+    "type": "unknown",
+    "family": "unknown",
+    "supports_thinking": False,
+    "context_length": 4096,
+    "recommended_device": "cuda"
+})
+
+def _lookup_model_info(model_name: str) -> Mapping[str, Any]:
+    """Return the shared MODEL_INFO entry for a model (or the default info) without copying it."""
+    info = _MODEL_INFO_VIEWS.get(model_name)
+    if not info and isinstance(model_name, str):
+        info = _MODEL_INFO_LOWER.get(model_name.lower())
+    if not info:
+        logger.warning(f"No information available for model: {model_name}")
+        return _DEFAULT_INFO
+    return info
+
 def get_model_info(model_name: str) -> Dict[str, Any]:
     """
     Get information about a model.
@@ -223,22 +253,9 @@ def get_model_info(model_name: str) -> Dict[str, Any]:
         model_name: Name of the model
         
     Returns:
-        Dictionary with model information
+        Dictionary with model information (a copy the caller may modify)
     """
-    info = MODEL_INFO.get(model_name, {})
-    
-    if not info:
-        logger.warning(f"No information available for model: {model_name}")
-        # Return default info
-        info = {
-            "type": "unknown",
-            "family": "unknown",
-            "supports_thinking": False,
-            "context_length": 4096,
-            "recommended_device": "cuda"
-        }
-    
-    return info.copy()
+    return dict(_lookup_model_info(model_name))
 
 def supports_thinking(model_name: str) -> bool:
     """
@@ -250,7 +267,7 @@ def supports_thinking(model_name: str) -> bool:
     Returns:
         True if model supports thinking, False otherwise
     """
-    info = get_model_info(model_name)
+    info = _lookup_model_info(model_name)
     return info.get("supports_thinking", False)
 
 def get_thinking_format(model_name: str) -> Optional[str]:
@@ -263,7 +280,7 @@ def get_thinking_format(model_name: str) -> Optional[str]:
     Returns:
         Thinking format string or None if not supported
     """
-    info = get_model_info(model_name)
+    info = _lookup_model_info(model_name)
     return info.get("thinking_format")
 
 def get_recommended_device(model_name: str) -> str:
@@ -276,7 +293,7 @@ def get_recommended_device(model_name: str) -> str:
     Returns:
         Recommended device string
     """
-    info = get_model_info(model_name)
+    info = _lookup_model_info(model_name)
     return info.get("recommended_device", "cuda")
 
 def is_local_model(model_name: str) -> bool:
@@ -289,7 +306,7 @@ def is_local_model(model_name: str) -> bool:
     Returns:
         True if local model, False otherwise
     """
-    info = get_model_info(model_name)
+    info = _lookup_model_info(model_name)
     return info.get("type") == "local"
 
 def is_api_model(model_name: str) -> bool:
@@ -302,7 +319,7 @@ def is_api_model(model_name: str) -> bool:
     Returns:
         True if API model, False otherwise
     """
-    info = get_model_info(model_name)
+    info = _lookup_model_info(model_name)
     return info.get("type") == "api"
 
 def get_model_provider(model_name: str) -> Optional[str]:
@@ -315,7 +332,7 @@ def get_model_provider(model_name: str) -> Optional[str]:
     Returns:
         Provider name or None if not an API model
     """
-    info = get_model_info(model_name)
+    info = _lookup_model_info(model_name)
     return info.get("provider")
 
 def validate_model_name(model_name: str) -> bool:
@@ -328,4 +345,4 @@ def validate_model_name(model_name: str) -> bool:
     Returns:
         True if model is supported, False otherwise
     """
-    return model_name in MODEL_INFO
+    return model_name in MODEL_INFO or model_name.lower() in _MODEL_INFO_LOWER
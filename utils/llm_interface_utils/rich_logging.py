@@ -1,9 +1,13 @@
+import json
 from typing import Any, Dict, List, Union
 
 from rich.console import Console
+from rich.markup import escape
 from rich.panel import Panel
 
 console = Console()
+# When output is redirected (batch runs), skip Rich markup parsing and panel layout entirely
+_IS_TTY = console.is_terminal
 
 
 def _summarize_image_part(part: Dict[str, Any], index: int) -> str:
@@ -17,33 +21,44 @@ def _summarize_image_part(part: Dict[str, Any], index: int) -> str:
 def format_message_content(content: Union[str, List[Dict[str, Any]], Dict[str, Any]]) -> str:
     if isinstance(content, str):
         return content
+    if content is None:
+        return ""
     if isinstance(content, dict):
-        return str(content)
+        return json.dumps(content, ensure_ascii=False, default=str)
     segments: List[str] = []
+    append = segments.append
     image_counter = 1
     for part in content or []:
         part_type = part.get("type")
         if part_type == "text":
-            segments.append(part.get("text", ""))
+            text = part.get("text", "")
+            if text:
+                append(text)
         elif part_type == "image_base64":
-            segments.append(_summarize_image_part(part, image_counter))
+            append(_summarize_image_part(part, image_counter))
             image_counter += 1
         else:
-            segments.append(str(part))
-    return "\n".join(filter(None, segments))
+            append(str(part))
+    # Empty text parts are never appended, so the list can be joined directly
+    return "\n".join(segments)
 
 
 def print_user_panel(content: Union[str, List[Dict[str, Any]], Dict[str, Any]], title: str = "User → Model") -> None:
+    if not _IS_TTY:
+        print(f"{title}: {format_message_content(content)}")
+        return
     console.print(Panel(format_message_content(content), title=title, style="cyan"))
 
 
 def print_assistant_panel(text: str, title: str = "Model → Assistant") -> None:
-    # Escape Rich markup tags by doubling brackets to prevent parsing errors
+    if not _IS_TTY:
+        print(f"{title}: {text.strip() if text else ''}")
+        return
+    # Escape Rich markup tags to prevent parsing errors
     # This handles cases where LLM output contains bracket tags like [/Reasoning]
-    # Rich uses [text] for markup, so [ becomes [[ and ] becomes ]] to escape
     try:
-        # Escape brackets to prevent Rich from trying to parse them as markup
-        escaped_text = (text.strip() if text else "").replace("[", "[[").replace("]", "]]")
+        # Backslash-escape anything Rich would parse as markup, in a single pass
+        escaped_text = escape(text.strip() if text else "")
         console.print(Panel(escaped_text, title=title, style="red"))
     except Exception:
         # Fallback: just print as plain text without panel if anything goes wrong
@@ -2,11 +2,107 @@
 Token counting utilities for different models and tokenizers.
 """
 
-from typing import Dict, Optional, Union
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Token counts from real tokenizers, keyed by (id(tokenizer), digest of the text) so cached prompts are not
+# kept alive; system prompts and other repeated strings recur across turns
+_TOKEN_COUNT_CACHE_MAX_ENTRIES = 2048
+_token_count_cache: "OrderedDict[Tuple[int, bytes], int]" = OrderedDict()
+# Tokenizer ids with a finalizer registered, so a reused id never sees a dead tokenizer's counts
+_tracked_tokenizer_ids = set()
+# Reentrant: a finalizer can fire during garbage collection while this thread holds the lock
+_token_count_cache_lock = threading.RLock()
+
+def _drop_tokenizer_counts(tokenizer_id: int) -> None:
+    """Forget cached counts for a tokenizer that has been garbage collected."""
+    with _token_count_cache_lock:
+        _tracked_tokenizer_ids.discard(tokenizer_id)
+        for key in [key for key in _token_count_cache if key[0] == tokenizer_id]:
+            del _token_count_cache[key]
+
+def _text_digest(text: str) -> bytes:
+    """Return a short fixed-size digest of text for use as a cache key."""
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+def _encode_length(tokenizer, text: str) -> int:
+    """Run the tokenizer and return the number of tokens produced."""
+    if hasattr(tokenizer, 'encode'):
+        return len(tokenizer.encode(text))
+    if hasattr(tokenizer, 'tokenize'):
+        return len(tokenizer.tokenize(text))
+    # Plain token-id lists only; materializing a tensor just to read its length is wasted work
+    encoded = tokenizer(text, add_special_tokens=False)
+    return len(encoded['input_ids'])
+
+def _lookup_token_count(tokenizer, text: str) -> Optional[int]:
+    """Return a cached count for this tokenizer and text, or None."""
+    key = (id(tokenizer), _text_digest(text))
+    with _token_count_cache_lock:
+        count = _token_count_cache.get(key)
+        if count is not None:
+            _token_count_cache.move_to_end(key)
+        return count
+
+def _store_token_count(tokenizer, text: str, count: int) -> None:
+    """Cache a count for this tokenizer and text, evicting the least recently used entry."""
+    tokenizer_id = id(tokenizer)
+    with _token_count_cache_lock:
+        if tokenizer_id not in _tracked_tokenizer_ids:
+            try:
+                weakref.finalize(tokenizer, _drop_tokenizer_counts, tokenizer_id)
+            except TypeError:
+                # Not weak-referenceable, so a stale id could not be detected; don't cache
+                return
+            _tracked_tokenizer_ids.add(tokenizer_id)
+        _token_count_cache[(tokenizer_id, _text_digest(text))] = count
+        if len(_token_count_cache) > _TOKEN_COUNT_CACHE_MAX_ENTRIES:
+            _token_count_cache.popitem(last=False)
+
+def _cached_token_count(tokenizer, text: str) -> int:
+    """Return the tokenizer's count for text, reusing earlier results for the same tokenizer."""
+    count = _lookup_token_count(tokenizer, text)
+    if count is None:
+        count = _encode_length(tokenizer, text)
+        _store_token_count(tokenizer, text, count)
+    return count
+
+def _count_tokens_batch(
+    texts: List[str],
+    tokenizer=None,
+    model_name: Optional[str] = None
+) -> List[int]:
+    """Count tokens for several texts, encoding all cache misses in one tokenizer call when possible."""
+    # Batching needs a HuggingFace-style tokenizer: callable on a list, and encode() for matching counts
+    if tokenizer is None or not (hasattr(tokenizer, 'encode') and callable(tokenizer)):
+        return [count_tokens(text, tokenizer, model_name) for text in texts]
+    
+    counts: List[Optional[int]] = [
+        _lookup_token_count(tokenizer, text) if text else 0 for text in texts
+    ]
+    missing = [i for i, count in enumerate(counts) if count is None]
+    if len(missing) > 1:
+        try:
+            # Same defaults as encode(), so the counts match the single-text path
+            encoded = tokenizer([texts[i] for i in missing])
+            for i, ids in zip(missing, encoded['input_ids']):
+                counts[i] = len(ids)
+                _store_token_count(tokenizer, texts[i], counts[i])
+        except Exception as e:
+            logger.warning(f"Batch tokenization failed, counting texts individually: {e}")
+    
+    return [
+        count if count is not None else count_tokens(text, tokenizer, model_name)
+        for text, count in zip(texts, counts)
+    ]
+
 def count_tokens(
     text: str, 
     tokenizer=None, 
@@ -23,14 +119,13 @@ def count_tokens(
     Returns:
         Number of tokens
     """
+    if not text:
+        return 0
     if tokenizer is not None:
         try:
             # Try different tokenizer methods
-            if hasattr(tokenizer, 'encode'):
-                return len(tokenizer.encode(text))
-            elif hasattr(tokenizer, '__call__'):
-                encoded = tokenizer(text, return_tensors="pt", add_special_tokens=False)
-                return encoded['input_ids'].shape[1]
+            if hasattr(tokenizer, 'encode') or hasattr(tokenizer, 'tokenize') or hasattr(tokenizer, '__call__'):
+                return _cached_token_count(tokenizer, text)
             else:
                 logger.warning("Tokenizer doesn't have expected methods, using estimation")
         except Exception as e:
@@ -39,6 +134,24 @@ def count_tokens(
     # Fallback to estimation
     return estimate_tokens(text, model_name)
 
+# (substring of the lowercased model name, numerator, denominator) applied to the base estimate;
+# checked in order, first match wins
+_MODEL_TOKEN_MULTIPLIERS = (
+    ('gpt', 11, 10),       # GPT models tend to have slightly more tokens
+    ('llama', 1, 1),       # Llama models are similar to base estimate
+    ('qwen', 12, 10),      # Chinese-capable models might have different tokenization
+    ('deepseek', 12, 10),
+)
+
+@lru_cache(maxsize=64)
+def _token_multiplier(model_name: str) -> Optional[Tuple[int, int]]:
+    """Return the (numerator, denominator) estimate multiplier for a model, or None if unknown."""
+    lowered = model_name.lower()
+    for family, numerator, denominator in _MODEL_TOKEN_MULTIPLIERS:
+        if family in lowered:
+            return numerator, denominator
+    return None
+
 def estimate_tokens(text: str, model_name: Optional[str] = None) -> int:
     """
     Estimate token count using heuristics.
@@ -50,23 +163,28 @@ def estimate_tokens(text: str, model_name: Optional[str] = None) -> int:
     Returns:
         Estimated number of tokens
     """
+    if not text:
+        return 0
+    text_length = len(text)
+    if text_length < 4:
+        # Shorter than one typical token: skip the model lookup entirely
+        return 1
+    
     # Basic estimation: ~4 characters per token for most models
-    base_estimate = len(text) // 4
+    base_estimate = text_length // 4
     
-    # Model-specific adjustments
+    # Model-specific adjustments, in integer arithmetic
     if model_name:
-        if 'gpt' in model_name.lower():
-            # GPT models tend to have slightly more tokens
-            return int(base_estimate * 1.1)
-        elif 'llama' in model_name.lower():
-            # Llama models are similar to base estimate
-            return base_estimate
-        elif 'qwen' in model_name.lower() or 'deepseek' in model_name.lower():
-            # Chinese-capable models might have different tokenization
-            return int(base_estimate * 1.2)
+        multiplier = _token_multiplier(model_name)
+        if multiplier is not None:
+            numerator, denominator = multiplier
+            return base_estimate * numerator // denominator
     
     return max(1, base_estimate)
 
+# Below this input length the startswith check costs more than re-counting the prompt saves
+_SHARED_PREFIX_MIN_CHARS = 256
+
 def get_token_usage(
     input_text: str,
     output_text: str,
@@ -78,15 +196,18 @@ def get_token_usage(
     
     Args:
         input_text: Input text
-        output_text: Generated output text
+        output_text: Generated output text (if it echoes input_text as a prefix, only the
+            continuation is counted as output)
         tokenizer: Tokenizer object (if available)
         model_name: Model name for estimation
         
     Returns:
         Dictionary with input_tokens, output_tokens, and total_tokens
     """
-    input_tokens = count_tokens(input_text, tokenizer, model_name)
-    output_tokens = count_tokens(output_text, tokenizer, model_name)
+    # Completions that echo a long prompt: tokenize only the new text instead of the prompt again
+    if len(input_text) > _SHARED_PREFIX_MIN_CHARS and output_text.startswith(input_text):
+        output_text = output_text[len(input_text):]
+    input_tokens, output_tokens = _count_tokens_batch([input_text, output_text], tokenizer, model_name)
     
     return {
         'input_tokens': input_tokens,
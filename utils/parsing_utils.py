@@ -1,9 +1,28 @@
 import json
-import re
 import logging
+from typing import Optional
+
+try:
+    import orjson
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so the handlers below catch both
+    _json_loads = orjson.loads
+except ImportError:
+    # orjson is optional; the stdlib parser produces the same lists
+    _json_loads = json.loads
 
 logger = logging.getLogger(__name__)
 
+_KEYS_OPEN = '<keys>'
+_KEYS_CLOSE = '</keys>'
+# Largest <keys> payload we will look for a closing tag in (and hand to the JSON parser); a
+# five-segment plan is well under 1 KB, so anything bigger is a runaway response
+_MAX_KEYS_CHARS = 65536
+_QUOTE_TABLE = str.maketrans({"'": '"'})
+# Five NOOP segments returned whenever a response can't be parsed; shared, so callers must not mutate it
+_NOOP_FALLBACK = [[None]] * 5
+# Sentinel for KEY_MAPPING lookups, since NOOP legitimately maps to None
+_MISSING = object()
+
 KEY_MAPPING = {
     "UP": 38,
     "DOWN": 40,
@@ -27,65 +46,92 @@ KEY_MAPPING = {
     "HOLD_SPACE": ("HOLD", 32),
 }
 
+def _load_action_segments(response_text: str) -> Optional[list]:
+    """Decode the <keys> block into five lists of raw action names; [] if it isn't a list, None on failure."""
+    # Plain substring search for the first <keys>...</keys> pair
+    start = response_text.find(_KEYS_OPEN)
+    if start < 0:
+        logger.warning("No <keys> tag found in response")
+        return None
+    start += len(_KEYS_OPEN)
+    end = response_text.find(_KEYS_CLOSE, start, start + _MAX_KEYS_CHARS + len(_KEYS_CLOSE))
+    if end < 0:
+        logger.warning(f"No </keys> within {_MAX_KEYS_CHARS} characters of <keys>, ignoring the actions")
+        return None
+    try:
+        actions_str = response_text[start:end].strip()
+        # Using json.loads to safely parse the list string
+        # The LLM is expected to output valid JSON: [["UP"], ["LEFT", "RIGHT"], ["NOOP"], ...]
+        # Only replace single quotes with double quotes if the direct parse fails
+        try:
+            action_segments = _json_loads(actions_str)
+        except json.JSONDecodeError:
+            if "'" not in actions_str or '"' in actions_str:
+                raise
+            action_segments = _json_loads(actions_str.translate(_QUOTE_TABLE))
+        
+        # Validate that we have exactly 5 segments
+        if not isinstance(action_segments, list):
+            logger.error("Actions must be a list")
+            return []
+        
+        if len(action_segments) != 5:
+            logger.warning(f"Expected 5 action segments, got {len(action_segments)}. Padding or truncating.")
+            if len(action_segments) < 5:
+                action_segments.extend([["NOOP"]] * (5 - len(action_segments)))
+            else:
+                action_segments = action_segments[:5]
+        
+        # json.loads only produces exact lists and strs, so identity type checks suffice below
+        for segment_idx, segment in enumerate(action_segments):
+            if type(segment) is not list:
+                logger.warning(f"Segment {segment_idx} is not a list, converting to list")
+                action_segments[segment_idx] = [segment] if segment else ["NOOP"]
+        return action_segments
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse actions JSON: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Error parsing actions: {e}")
+        return None
+
 def parse_actions(response_text: str) -> list[list]:
     """
     Extract actions from LLM response.
     Returns a list of 5 lists, where each inner list contains actions for one time segment.
     Each action can be an instant action (applied once) or a continuous action (held for duration).
     """
-    match = re.search(r'<keys>(.*?)</keys>', response_text, re.DOTALL)
-    if match:
-        try:
-            actions_str = match.group(1).strip()
-            # Using json.loads to safely parse the list string
-            # The LLM is expected to output valid JSON: [["UP"], ["LEFT", "RIGHT"], ["NOOP"], ...]
-            # Only replace single quotes with double quotes if necessary
-            if "'" in actions_str and '"' not in actions_str:
-                actions_str = actions_str.replace("'", '"')
-            
-            action_segments = json.loads(actions_str)
-            
-            # Validate that we have exactly 5 segments
-            if not isinstance(action_segments, list):
-                logger.error("Actions must be a list")
-                return []
-            
-            if len(action_segments) != 5:
-                logger.warning(f"Expected 5 action segments, got {len(action_segments)}. Padding or truncating.")
-                if len(action_segments) < 5:
-                    action_segments.extend([["NOOP"]] * (5 - len(action_segments)))
-                else:
-                    action_segments = action_segments[:5]
-            
-            parsed_segments = []
-            for segment_idx, segment in enumerate(action_segments):
-                if not isinstance(segment, list):
-                    logger.warning(f"Segment {segment_idx} is not a list, converting to list")
-                    segment = [segment] if segment else ["NOOP"]
-                
-                parsed_segment = []
-                for action_name in segment:
-                    if action_name is None:
-                        action_name = "NOOP"
-                    action_name = str(action_name).upper()
-                    
-                    if action_name in KEY_MAPPING:
-                        parsed_segment.append(KEY_MAPPING[action_name])
-                    elif action_name == "NOOP":
-                        parsed_segment.append(None)
-                    else:
-                        logger.warning(f"Unknown action: {action_name} in segment {segment_idx}")
+    action_segments = _load_action_segments(response_text)
+    if action_segments is None:
+        return _NOOP_FALLBACK  # Return 5 NOOP segments on error
+    try:
+        parsed_segments = []
+        # Local bindings for the per-action loop
+        mapping_get = KEY_MAPPING.get
+        missing = _MISSING
+        for segment_idx, segment in enumerate(action_segments):
+            parsed_segment = []
+            append = parsed_segment.append
+            for action_name in segment:
+                if action_name is None:
+                    append(None)
+                    continue
+                if type(action_name) is not str:
+                    action_name = str(action_name)
                 
-                parsed_segments.append(parsed_segment)
+                # Models usually emit the canonical uppercase names; only uppercase on a miss
+                key_code = mapping_get(action_name, missing)
+                if key_code is missing:
+                    action_name = action_name.upper()
+                    key_code = mapping_get(action_name, missing)
+                if key_code is not missing:
+                    append(key_code)
+                else:
+                    logger.warning(f"Unknown action: {action_name} in segment {segment_idx}")
             
-            return parsed_segments
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse actions JSON: {e}")
-            return [[None]] * 5  # Return 5 NOOP segments on error
-        except Exception as e:
-            logger.error(f"Error parsing actions: {e}")
-            return [[None]] * 5
-    else:
-        logger.warning("No <keys> tag found in response")
-        return [[None]] * 5
-
+            parsed_segments.append(parsed_segment)
+        
+        return parsed_segments
+    except Exception as e:
+        logger.error(f"Error parsing actions: {e}")
+        return _NOOP_FALLBACK